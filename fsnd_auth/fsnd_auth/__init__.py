@@ -0,0 +1,5 @@
+from .keys import JWKSUnavailable, LocalKeys, RemoteJWKS, keys_from_env
+from .permissions import (AllOf, AnyOf, Grants, Requirement,
+                          authorization_stats, compile_permission)
+from .tokens import TokenCache
+from .verifier import Auth, AuthError, get_token_auth_header
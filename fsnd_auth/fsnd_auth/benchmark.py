@@ -0,0 +1,92 @@
+'''
+Micro-benchmark of token verification throughput per algorithm, with and
+without the verified-token cache.
+
+    $ python -m fsnd_auth.benchmark --iterations 2000
+'''
+
+import argparse
+import time
+
+from jose import jwt
+
+from .keys import LocalKeys
+from .verifier import Auth, SUPPORTED_ALGORITHMS
+
+AUDIENCE = 'benchmark'
+ISSUER = 'https://benchmark.example.com/'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Measure token verification throughput per algorithm.')
+    parser.add_argument('--algorithms', nargs='+',
+                        default=list(SUPPORTED_ALGORITHMS),
+                        choices=SUPPORTED_ALGORITHMS)
+    parser.add_argument('--iterations', type=int, default=1000)
+    return parser.parse_args()
+
+
+def rsa_keys(bits=2048):
+    try:
+        from Crypto.PublicKey import RSA
+    except ImportError:
+        # python-jose's pure-Python backend.
+        import rsa
+        public, private = rsa.newkeys(bits)
+        return private.save_pkcs1().decode(), public.save_pkcs1().decode()
+    key = RSA.generate(bits)
+    return key.exportKey().decode(), key.publickey().exportKey().decode()
+
+
+def ec_keys():
+    from ecdsa import NIST256p, SigningKey
+    key = SigningKey.generate(curve=NIST256p)
+    return key.to_pem().decode(), key.get_verifying_key().to_pem().decode()
+
+
+def signing_keys(algorithm):
+    '''
+    Returns (signing key, verifying key).
+    '''
+    if algorithm == 'HS256':
+        secret = 'benchmark-secret-' * 2
+        return secret, secret
+    if algorithm == 'RS256':
+        return rsa_keys()
+    return ec_keys()
+
+
+def measure(auth, token, iterations):
+    auth.verify(token)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        auth.verify(token)
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed, elapsed / iterations * 1e6
+
+
+def main():
+    args = parse_args()
+    print('{:<8} {:<10} {:>12} {:>12}'.format(
+        'alg', 'cache', 'verify/s', 'us/verify'))
+    for algorithm in args.algorithms:
+        signing_key, verifying_key = signing_keys(algorithm)
+        token = jwt.encode({
+            'aud': AUDIENCE,
+            'iss': ISSUER,
+            'sub': 'benchmark',
+            'exp': int(time.time()) + 3600,
+            'permissions': ['get:drinks-detail'],
+        }, signing_key, algorithm=algorithm)
+        keys = LocalKeys.from_key(verifying_key)
+        for cache_size, label in ((0, 'off'), (1024, 'on')):
+            auth = Auth(keys, AUDIENCE, ISSUER, algorithms=[algorithm],
+                        token_cache_size=cache_size)
+            per_second, micros = measure(auth, token, args.iterations)
+            print('{:<8} {:<10} {:>12.0f} {:>12.1f}'.format(
+                algorithm, label, per_second, micros))
+
+
+if __name__ == '__main__':
+    main()
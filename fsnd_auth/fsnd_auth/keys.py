@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import threading
+import time
+from urllib.request import urlopen
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSUnavailable(Exception):
+    pass
+
+
+class RemoteJWKS(object):
+    '''
+    Signing keys of a JWKS endpoint, indexed by kid.
+
+    Keys are fetched on first use and kept for ttl seconds. Past that they
+    are still served while a background thread refreshes them. A kid that is
+    not in the cache, e.g. after a key rotation, triggers an immediate
+    refresh, at most once every min_refresh_interval seconds. If a refresh
+    fails, the keys already cached keep being served.
+
+    url may be any URL urlopen accepts, including file:// for a local
+    JWKS file.
+    '''
+
+    def __init__(self, url, ttl=600, min_refresh_interval=30, timeout=5):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.keys = {}
+        self.fetched_at = None
+        self.attempted_at = None
+        self.refreshing = False
+        self.lock = threading.Lock()
+        # Held for the duration of a fetch, so concurrent callers wait for
+        # the one in flight instead of failing or fetching again.
+        self.fetch_lock = threading.Lock()
+
+    def fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+        return {key['kid']: key for key in jwks.get('keys', []) if 'kid' in key}
+
+    def refresh(self):
+        '''
+        Fetches the keys and replaces the cached ones. Returns False, keeping
+        the cached keys, if the fetch fails.
+        '''
+        with self.lock:
+            self.attempted_at = time.monotonic()
+        try:
+            keys = self.fetch()
+        except Exception:
+            logger.exception('Unable to fetch JWKS from %s', self.url)
+            return False
+        with self.lock:
+            self.keys = keys
+            self.fetched_at = time.monotonic()
+        return True
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                with self.fetch_lock:
+                    self.refresh()
+            finally:
+                with self.lock:
+                    self.refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def may_refresh(self):
+        return (self.attempted_at is None or
+                time.monotonic() - self.attempted_at >= self.min_refresh_interval)
+
+    def refresh_unless(self, done):
+        '''
+        Refreshes, unless done() holds once any fetch in flight has
+        finished or the last attempt is too recent.
+        '''
+        with self.fetch_lock:
+            if not done() and self.may_refresh():
+                self.refresh()
+
+    def get_key(self, kid):
+        '''
+        Returns the JWK with the given kid, or None if the endpoint does not
+        know it. Raises JWKSUnavailable if no keys could ever be fetched.
+        '''
+        if kid is None:
+            return None
+        if self.fetched_at is None:
+            self.refresh_unless(lambda: self.fetched_at is not None)
+            if self.fetched_at is None:
+                raise JWKSUnavailable(self.url)
+        elif (time.monotonic() - self.fetched_at > self.ttl
+              and self.may_refresh()):
+            self.refresh_in_background()
+
+        if kid not in self.keys:
+            self.refresh_unless(lambda: kid in self.keys)
+        return self.keys.get(kid)
+
+
+class LocalKeys(object):
+    '''
+    Fixed keys, for offline operation or tests: JWKs, PEM public keys or
+    HS256 secrets, indexed by kid. A key loaded without a kid verifies
+    tokens whose kid matches no other key; a token without a kid is also
+    verified with the only key, if there is just one.
+    '''
+
+    def __init__(self, keys):
+        self.keys = dict(keys)
+
+    @classmethod
+    def from_jwks(cls, jwks):
+        return cls((key.get('kid'), key) for key in jwks.get('keys', []))
+
+    @classmethod
+    def from_file(cls, path, kid=None):
+        '''
+        Loads a JWKS (JSON) file or a PEM public key.
+        '''
+        with open(path) as key_file:
+            content = key_file.read()
+        if content.lstrip().startswith('{'):
+            return cls.from_jwks(json.loads(content))
+        return cls.from_key(content, kid)
+
+    @classmethod
+    def from_key(cls, key, kid=None):
+        '''
+        A single PEM public key or HS256 secret.
+        '''
+        return cls({kid: key})
+
+    def get_key(self, kid):
+        if kid is None and len(self.keys) == 1:
+            return next(iter(self.keys.values()))
+        return self.keys.get(kid, self.keys.get(None))
+
+
+def keys_from_env(jwks_url):
+    '''
+    The key provider an app should use: the JWKS or PEM file named by
+    AUTH_KEYS_FILE if set, else the JWKS at JWKS_URL, defaulting to jwks_url.
+    '''
+    path = os.environ.get('AUTH_KEYS_FILE')
+    if path:
+        return LocalKeys.from_file(path)
+    return RemoteJWKS(os.environ.get('JWKS_URL', jwks_url))
@@ -0,0 +1,130 @@
+import threading
+
+
+class AnyOf(object):
+    '''
+    Requirement met by any one of its parts, e.g.
+    AnyOf('patch:drinks', 'delete:drinks').
+    '''
+
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def __str__(self):
+        return 'any_of({})'.format(', '.join(str(part) for part in self.parts))
+
+
+class AllOf(object):
+    '''
+    Requirement met only by all of its parts together. A list or tuple of
+    parts means the same.
+    '''
+
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def __str__(self):
+        return 'all_of({})'.format(', '.join(str(part) for part in self.parts))
+
+
+def split_permission(permission):
+    action, _, resource = permission.partition(':')
+    return action, resource
+
+
+class Grants(object):
+    '''
+    The permissions of one verified token, as sets built once per token.
+    A granted '*:drinks' allows every action on drinks; a required
+    '*:drinks' is met by any granted action on drinks.
+    '''
+    __slots__ = ('names', 'resources', 'all_actions')
+
+    def __init__(self, permissions):
+        self.names = frozenset(permissions)
+        self.resources = frozenset(
+            split_permission(name)[1] for name in self.names)
+        self.all_actions = frozenset(
+            resource for action, resource in map(split_permission, self.names)
+            if action == '*')
+
+    def has(self, permission):
+        if permission in self.names:
+            return True
+        action, resource = split_permission(permission)
+        if not resource:
+            return False
+        if action == '*':
+            return resource in self.resources
+        return resource in self.all_actions
+
+
+def _groups(spec):
+    # Flattens a requirement into alternatives, each a set of permissions
+    # that must all be granted.
+    if isinstance(spec, str):
+        return [frozenset([spec])] if spec else [frozenset()]
+    if isinstance(spec, AnyOf):
+        return [group for part in spec.parts for group in _groups(part)]
+    parts = spec.parts if isinstance(spec, AllOf) else spec
+    groups = [frozenset()]
+    for part in parts:
+        groups = [group | alternative
+                  for group in groups for alternative in _groups(part)]
+    return groups
+
+
+class Requirement(object):
+    '''
+    A permission requirement compiled into frozensets, with counters of the
+    requests it allowed and denied.
+    '''
+
+    def __init__(self, spec):
+        self.name = str(spec) if not isinstance(spec, (list, tuple)) \
+            else str(AllOf(*spec))
+        self.groups = tuple(set(_groups(spec)))
+        self.allowed = 0
+        self.denied = 0
+        self.lock = threading.Lock()
+
+    def satisfied_by(self, grants):
+        for group in self.groups:
+            if group <= grants.names:
+                return True
+            if all(grants.has(permission)
+                   for permission in group - grants.names):
+                return True
+        return False
+
+    def check(self, grants):
+        allowed = self.satisfied_by(grants)
+        with self.lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.denied += 1
+        return allowed
+
+
+# Every compiled requirement by name, for authorization_stats().
+requirements = {}
+
+
+def compile_permission(spec):
+    '''
+    Returns the Requirement for a permission string, AnyOf/AllOf
+    combination or list of permissions; the same object for equal specs.
+    '''
+    if isinstance(spec, Requirement):
+        return spec
+    if isinstance(spec, str) and spec in requirements:
+        return requirements[spec]
+    requirement = Requirement(spec)
+    return requirements.setdefault(requirement.name, requirement)
+
+
+def authorization_stats():
+    return {name: {'allowed': requirement.allowed,
+                   'denied': requirement.denied}
+            for name, requirement in sorted(requirements.items())}
@@ -0,0 +1,201 @@
+from functools import wraps
+
+from flask import request
+from jose import jwt
+from jose.exceptions import JWTError
+
+from .keys import JWKSUnavailable
+from .permissions import Grants, compile_permission
+from .tokens import TokenCache
+
+SUPPORTED_ALGORITHMS = ('HS256', 'RS256', 'ES256')
+
+
+class AuthError(Exception):
+    def __init__(self, error, status_code):
+        self.error = error
+        self.status_code = status_code
+
+
+def get_token_auth_header():
+    """Obtains the Access Token from the Authorization Header
+    """
+    auth = request.headers.get('Authorization', None)
+    if not auth:
+        raise AuthError({
+            'code': 'authorization_header_missing',
+            'description': 'Authorization header is expected.'
+        }, 401)
+
+    parts = auth.split()
+    if parts[0].lower() != 'bearer':
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must start with "Bearer".'
+        }, 401)
+
+    elif len(parts) == 1:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Token not found.'
+        }, 401)
+
+    elif len(parts) > 2:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must be bearer token.'
+        }, 401)
+
+    token = parts[1]
+    return token
+
+
+class Auth(object):
+    '''
+    Verifies bearer tokens for one API: signed with one of algorithms by a
+    key from keys (RemoteJWKS or LocalKeys), for audience, by issuer.
+    Verified tokens are cached, up to token_cache_size of them (0 disables
+    the cache).
+    '''
+
+    def __init__(self, keys, audience, issuer, algorithms=('RS256',),
+                 token_cache_size=1024):
+        unsupported = set(algorithms) - set(SUPPORTED_ALGORITHMS)
+        if unsupported:
+            raise ValueError('Unsupported algorithms: {}'.format(
+                ', '.join(sorted(unsupported))))
+        self.keys = keys
+        self.audience = audience
+        self.issuer = issuer
+        self.algorithms = list(algorithms)
+        self.token_cache = TokenCache(token_cache_size) \
+            if token_cache_size else None
+
+    def get_signing_key(self, token):
+        try:
+            unverified_header = jwt.get_unverified_header(token)
+        except JWTError:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+
+        algorithm = unverified_header.get('alg')
+        if algorithm not in self.algorithms:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unsupported signing algorithm.'
+            }, 401)
+
+        kid = unverified_header.get('kid')
+        try:
+            key = self.keys.get_key(kid)
+        except JWKSUnavailable:
+            raise AuthError({
+                'code': 'jwks_unavailable',
+                'description': 'Unable to fetch the signing keys.'
+            }, 503)
+
+        if key is None and kid is None:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Authorization malformed.'
+            }, 401)
+        # A JWK naming its algorithm is only used with that algorithm.
+        if key is None or (isinstance(key, dict) and
+                           key.get('alg', algorithm) != algorithm):
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to find the appropriate key.'
+            }, 400)
+        return algorithm, key
+
+    def verify_decode_jwt(self, token):
+        algorithm, key = self.get_signing_key(token)
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=[algorithm],
+                audience=self.audience,
+                issuer=self.issuer
+            )
+
+        except jwt.ExpiredSignatureError:
+            raise AuthError({
+                'code': 'token_expired',
+                'description': 'Token expired.'
+            }, 401)
+
+        except jwt.JWTClaimsError:
+            raise AuthError({
+                'code': 'invalid_claims',
+                'description': 'Incorrect claims. Please, check the audience and issuer.'
+            }, 401)
+        except Exception:
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+
+    def verify(self, token):
+        '''
+        Returns (payload, Grants) of a valid token, from the cache when the
+        token has been verified before.
+        '''
+        if self.token_cache is not None:
+            verified = self.token_cache.get(token)
+            if verified is not None:
+                return verified
+        payload = self.verify_decode_jwt(token)
+        verified = (payload, Grants(payload.get('permissions', ())))
+        if self.token_cache is not None:
+            self.token_cache.put(token, verified, payload.get('exp'))
+        return verified
+
+    def check_permissions(self, permission, payload, grants=None):
+        '''
+        permission is a permission string, an AnyOf/AllOf combination or a
+        Requirement compiled from one; grants, if given, are the Grants
+        already built from payload.
+        '''
+        if 'permissions' not in payload:
+            raise AuthError({
+                'success': False,
+                'code': 'invalid_claims',
+                'description': 'Permissions not included in JWT.'
+            }, 400)
+
+        if grants is None:
+            grants = Grants(payload['permissions'])
+        if not compile_permission(permission).check(grants):
+            raise AuthError({
+                'success': False,
+                'code': 'unauthorized',
+                'description': 'Permission not found.'
+            }, 401)
+        return True
+
+    def requires_auth(self, permission=None):
+        '''
+        Decorator passing the verified payload to the view. With a
+        permission, the token must also grant it. Usable bare, as
+        @requires_auth, to require a valid token only.
+        '''
+        if callable(permission):
+            return self.requires_auth()(permission)
+        # Compiled once, when the view is decorated.
+        requirement = None if permission is None \
+            else compile_permission(permission)
+
+        def requires_auth_decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                token = get_token_auth_header()
+                payload, grants = self.verify(token)
+                if requirement is not None:
+                    self.check_permissions(requirement, payload, grants)
+                return f(payload, *args, **kwargs)
+
+            return wrapper
+        return requires_auth_decorator
@@ -0,0 +1,10 @@
+from setuptools import setup
+
+# Flask and python-jose (or python-jose-cryptodome) come pinned from the
+# requirements.txt of the app installing this package.
+setup(
+    name='fsnd-auth',
+    version='0.1.0',
+    description='Auth0 bearer token verification shared by the FSND apps',
+    packages=['fsnd_auth'],
+)
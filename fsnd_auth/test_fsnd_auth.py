@@ -0,0 +1,213 @@
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+import unittest
+
+from flask import Flask, jsonify
+from jose import jwt
+
+from fsnd_auth import (AllOf, AnyOf, Auth, AuthError, Grants, JWKSUnavailable,
+                       LocalKeys, RemoteJWKS, TokenCache, compile_permission)
+
+SECRET = 'test-secret'
+AUDIENCE = 'drinks'
+ISSUER = 'https://fsnd.test/'
+
+
+def make_token(permissions, exp=3600, key=SECRET):
+    claims = {'sub': 'user', 'aud': AUDIENCE, 'iss': ISSUER,
+              'exp': int(time.time()) + exp, 'permissions': permissions}
+    return jwt.encode(claims, key, algorithm='HS256')
+
+
+class PermissionsTestCase(unittest.TestCase):
+
+    def allows(self, spec, permissions):
+        return compile_permission(spec).check(Grants(permissions))
+
+    def test_single_permission(self):
+        self.assertTrue(self.allows('get:drinks-detail', ['get:drinks-detail']))
+        self.assertFalse(self.allows('get:drinks-detail', ['get:drinks']))
+
+    def test_any_of(self):
+        spec = AnyOf('patch:drinks', 'delete:drinks')
+        self.assertTrue(self.allows(spec, ['delete:drinks']))
+        self.assertTrue(self.allows(spec, ['patch:drinks']))
+        self.assertFalse(self.allows(spec, ['get:drinks']))
+
+    def test_all_of(self):
+        spec = AllOf('patch:drinks', 'get:drinks-detail')
+        self.assertTrue(self.allows(spec, ['patch:drinks', 'get:drinks-detail']))
+        self.assertFalse(self.allows(spec, ['patch:drinks']))
+        # A list means the same as AllOf.
+        self.assertTrue(self.allows(['patch:drinks', 'get:drinks-detail'],
+                                    ['patch:drinks', 'get:drinks-detail']))
+        self.assertFalse(self.allows(['patch:drinks', 'get:drinks-detail'],
+                                     ['get:drinks-detail']))
+
+    def test_nested_combinations(self):
+        spec = AllOf('get:drinks', AnyOf('patch:drinks', 'delete:drinks'))
+        self.assertEqual(len(compile_permission(spec).groups), 2)
+        self.assertTrue(self.allows(spec, ['get:drinks', 'delete:drinks']))
+        self.assertFalse(self.allows(spec, ['patch:drinks', 'delete:drinks']))
+
+    def test_granted_wildcard_allows_every_action(self):
+        self.assertTrue(self.allows('patch:drinks', ['*:drinks']))
+        self.assertTrue(self.allows('delete:drinks', ['*:drinks']))
+        self.assertFalse(self.allows('patch:menus', ['*:drinks']))
+
+    def test_required_wildcard_needs_any_action(self):
+        self.assertTrue(self.allows('*:drinks', ['get:drinks']))
+        self.assertFalse(self.allows('*:drinks', ['get:menus']))
+        self.assertFalse(self.allows('*:drinks', []))
+
+    def test_compiled_once_with_counters(self):
+        requirement = compile_permission(AnyOf('post:menus', 'patch:menus'))
+        self.assertIs(compile_permission(AnyOf('post:menus', 'patch:menus')),
+                      requirement)
+        requirement.check(Grants(['post:menus']))
+        requirement.check(Grants([]))
+        self.assertEqual((requirement.allowed, requirement.denied), (1, 1))
+
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = TokenCache()
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 'payload', time.time() + 60)
+        self.assertEqual(cache.get('a'), 'payload')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_expired_token_is_dropped(self):
+        cache = TokenCache()
+        cache.put('a', 'payload', time.time() - 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expired'], 1)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_token_without_exp_is_not_cached(self):
+        cache = TokenCache()
+        cache.put('a', 'payload', None)
+        self.assertIsNone(cache.get('a'))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TokenCache(max_size=2)
+        exp = time.time() + 60
+        cache.put('a', 1, exp)
+        cache.put('b', 2, exp)
+        cache.get('a')
+        cache.put('c', 3, exp)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.stats()['evicted'], 1)
+
+
+class CountingJWKS(RemoteJWKS):
+
+    fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return super().fetch()
+
+
+class RemoteJWKSTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'jwks.json')
+        self.url = pathlib.Path(self.path).as_uri()
+        self.write_keys('k1')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_keys(self, *kids):
+        with open(self.path, 'w') as jwks_file:
+            json.dump({'keys': [{'kid': kid, 'kty': 'oct', 'k': kid}
+                                for kid in kids]}, jwks_file)
+
+    def test_unknown_kid_refresh_is_rate_limited(self):
+        keys = CountingJWKS(self.url, min_refresh_interval=60)
+        self.assertEqual(keys.get_key('k1')['k'], 'k1')
+        self.write_keys('k1', 'k2')
+        # The first fetch was just now: k2 is not looked up again yet.
+        self.assertIsNone(keys.get_key('k2'))
+        self.assertIsNone(keys.get_key('k2'))
+        self.assertEqual(keys.fetches, 1)
+
+    def test_unknown_kid_triggers_refresh(self):
+        keys = CountingJWKS(self.url, min_refresh_interval=0)
+        keys.get_key('k1')
+        self.write_keys('k1', 'k2')
+        self.assertEqual(keys.get_key('k2')['k'], 'k2')
+        self.assertEqual(keys.fetches, 2)
+
+    def test_cached_keys_served_when_fetch_fails(self):
+        keys = CountingJWKS(self.url, ttl=0, min_refresh_interval=0)
+        keys.get_key('k1')
+        os.remove(self.path)
+        self.assertIsNone(keys.get_key('k2'))
+        self.assertEqual(keys.get_key('k1')['k'], 'k1')
+
+    def test_unavailable_without_any_keys(self):
+        os.remove(self.path)
+        keys = RemoteJWKS(self.url)
+        with self.assertRaises(JWKSUnavailable):
+            keys.get_key('k1')
+
+
+class AuthTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.auth = Auth(LocalKeys.from_key(SECRET), AUDIENCE, ISSUER,
+                         algorithms=['HS256'])
+        self.app = Flask(__name__)
+
+        @self.app.route('/drinks', methods=['PATCH'])
+        @self.auth.requires_auth('patch:drinks')
+        def patch_drinks(payload):
+            return jsonify({'success': True})
+
+        @self.app.errorhandler(AuthError)
+        def auth_error(error):
+            return jsonify(error.error), error.status_code
+
+        self.client = self.app.test_client
+
+    def patch(self, token):
+        return self.client().patch(
+            '/drinks', headers={'Authorization': 'Bearer ' + token})
+
+    def test_allowed(self):
+        self.assertEqual(self.patch(make_token(['*:drinks'])).status_code, 200)
+
+    def test_denied(self):
+        res = self.patch(make_token(['get:drinks']))
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.get_json()['code'], 'unauthorized')
+
+    def test_expired(self):
+        res = self.patch(make_token(['patch:drinks'], exp=-60))
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.get_json()['code'], 'token_expired')
+
+    def test_wrong_key(self):
+        res = self.patch(make_token(['patch:drinks'], key='other-secret'))
+        self.assertEqual(res.status_code, 400)
+
+    def test_verified_token_is_cached(self):
+        token = make_token(['patch:drinks'])
+        self.patch(token)
+        self.patch(token)
+        stats = self.auth.token_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,18 +3,29 @@
 #----------------------------------------------------------------------------#
 
 from config import SQLALCHEMY_DATABASE_URI
+import codecs
 import json
+import shutil
+import tempfile
+import click
 import dateutil.parser
-import babel
 from datetime import datetime, timezone
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from itertools import groupby
+from flask import Flask, has_request_context, render_template, request, Response, stream_with_context, flash, redirect, url_for, abort, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import func, tuple_
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from search import NgramIndex
+from cache import make_cache
+from formatting import DatetimeFormatter
+from importer import BulkImporter, FORMATS, format_for, read_rows
+from exporter import MIMETYPES, export_chunks
+from instrumentation import init_instrumentation
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -25,6 +36,8 @@ moment = Moment(app)
 app.config.from_object('config')
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+cache = make_cache(app.config)
+init_instrumentation(app)
 
 
 #----------------------------------------------------------------------------#
@@ -41,6 +54,12 @@ class Show(db.Model):
         'Artist.id'), nullable=False)
     start_time = db.Column(db.DateTime())
 
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
+
     def __repr__(self):
         return '<Show {self.id} {self.name}>'
 
@@ -62,6 +81,12 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String(250))
     shows = db.relationship('Show', backref='venue', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_Venue_city_state', 'city', 'state'),
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
@@ -82,6 +107,11 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(250))
     shows = db.relationship('Show', backref='artist', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
@@ -91,15 +121,76 @@ class Artist(db.Model):
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(value, format, locale='en')
+datetime_formatter = DatetimeFormatter(app.config['DEFAULT_LOCALE'])
+
+
+def user_locale():
+    # Locale picked with ?locale= or the locale cookie, if it is supported.
+    if not has_request_context():
+        return None
+    locale = request.args.get('locale') or request.cookies.get('locale')
+    if locale in app.config['LOCALES']:
+        return locale
+    return None
+
+
+def format_datetime(value, format='medium', locale=None):
+    return datetime_formatter.format(value, format, locale or user_locale())
+
+
+def format_datetimes(values, format='medium', locale=None):
+    return datetime_formatter.format_many(values, format, locale or user_locale())
 
 
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.filters['datetimes'] = format_datetimes
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Fallback trigram indexes, one per model, for databases without pg_trgm.
+name_indexes = {}
+
+
+def name_index(model):
+    if model not in name_indexes:
+        name_indexes[model] = NgramIndex(
+            db.session.query(model.id, model.name))
+    return name_indexes[model]
+
+
+def update_name_index(model, id, name=None):
+    # Keeps an already built fallback index in step with writes;
+    # a name of None removes the entry.
+    index = name_indexes.get(model)
+    if index is not None:
+        index.add(id, name)
+
+
+def search_by_name(model, search_term):
+    limit = request.form.get(
+        'limit', app.config['SEARCH_RESULTS_LIMIT'], type=int)
+    offset = request.form.get('offset', 0, type=int)
+
+    if db.engine.dialect.name == 'postgresql':
+        # The pattern match is served by the gin_trgm_ops index on name.
+        pattern = '%{}%'.format(search_term.replace('\\', '\\\\').replace(
+            '%', '\\%').replace('_', '\\_'))
+        matches = db.session.query(model.id, model.name).filter(
+            model.name.ilike(pattern, escape='\\'))
+        count = matches.count()
+        rows = matches.order_by(
+            func.similarity(model.name, search_term).desc(), model.id
+        ).limit(limit).offset(offset).all()
+    else:
+        count, rows = name_index(model).search(search_term, limit, offset)
+
+    return {
+        "count": count,
+        "data": [{'id': id, 'name': name} for id, name in rows]
+    }
+
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -116,57 +207,104 @@ def index():
 
 @app.route('/venues')
 def venues():
-    areas = db.session.query(Venue.city, Venue.state).distinct()
+    areas = cache.get_or_load('areas', venue_areas)
+    return render_template('pages/venues.html', areas=areas)
+
+
+def venue_areas():
+    # One grouped statement returns every venue with its upcoming show count,
+    # ordered so that venues of the same area arrive next to each other.
+    now = datetime.utcnow()
+    rows = db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        func.count(Show.id).filter(Show.start_time > now).label(
+            'num_upcoming_shows')
+    ).outerjoin(Show, Show.venue_id == Venue.id).group_by(
+        Venue.city, Venue.state, Venue.id, Venue.name
+    ).order_by(Venue.city, Venue.state, Venue.id)
+
     data = []
-    for area in areas:
-        venues = Venue.query.filter_by(
-            state=area.state).filter_by(city=area.city).all()
-        venue_data = []
-        for venue in venues:
-            venue_data.append({
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': len(list(filter(lambda x: x.start_time > datetime.utcnow(), venue.shows)))
-            })
+    for (city, state), area_rows in groupby(rows, key=lambda row: (row.city, row.state)):
         data.append({
-            'city': area.city,
-            'state': area.state,
-            'venues': venue_data
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': row.id,
+                'name': row.name,
+                'num_upcoming_shows': row.num_upcoming_shows
+            } for row in area_rows]
         })
-    return render_template('pages/venues.html', areas=data)
+    return data
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-    search_str = request.form.get('search_term')
-    venue_search = Venue.query.filter(
-        Venue.name.ilike('%{}%'.format(search_str)))
-    venue_list = list(venue_search)
-    response = {
-        "count": len(venue_list),
-        "data": venue_list
-    }
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''), venue_query=Venue.query.filter(
-        Venue.name.ilike('%{}%'.format('search_term'))))
+    search_term = request.form.get('search_term', '')
+    response = search_by_name(Venue, search_term)
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
     form = VenueForm(request.form)
     genres = form.genres.data
-    now = datetime.utcnow()
-    venue = Venue.query.get(venue_id)
-    venue.upcoming_shows_count = db.session.query(Show).join(Artist, Show.artist_id == Artist.id).join(Venue, Show.venue_id == Venue.id).filter(
-        Show.venue_id == venue_id, Show.start_time >= now).count()
-    venue.upcoming_shows = db.session.query(Show).join(Artist, Show.artist_id == Artist.id).join(Venue, Show.venue_id == Venue.id).add_columns(
-        Artist.name.label("artist_name"), Show.start_time, Show.artist_id).filter(Show.venue_id == venue_id, Show.start_time >= now).all()
-    venue.past_shows_count = db.session.query(Show).join(Artist, Show.artist_id == Artist.id).filter(
-        Show.venue_id == venue_id,  Show.start_time < now).count()
-    venue.past_shows = db.session.query(Show).join(Artist, Show.artist_id == Artist.id).add_columns(
-        Artist.name.label("artist_name"), Show.start_time, Show.artist_id).filter(Show.venue_id == venue_id,  Show.start_time < now).all()
+    venue = cache.get_or_load('venue:{}'.format(venue_id), lambda: load_show_timeline(
+        Venue, venue_id, Show.venue_id, Artist, Show.artist_id, 'artist'))
     return render_template('pages/show_venue.html', form=form, venue=venue)
 
 
+def load_show_timeline(model, entity_id, entity_key, counterpart, counterpart_key, prefix):
+    # Loads the entity together with all of its shows in one round-trip and
+    # splits them into past and upcoming shows. Each show carries the id, name
+    # and image of the other side of the show (the artist for a venue page,
+    # the venue for an artist page), keyed with the given prefix. The result
+    # is a plain dict so that it can be cached outside of the session.
+    now = datetime.utcnow()
+    rows = db.session.query(
+        model,
+        Show.start_time,
+        counterpart.id,
+        counterpart.name,
+        counterpart.image_link
+    ).outerjoin(Show, entity_key == model.id).outerjoin(
+        counterpart, counterpart.id == counterpart_key
+    ).filter(model.id == entity_id).order_by(Show.start_time)
+
+    entity = None
+    upcoming_shows = []
+    past_shows = []
+    for row in rows:
+        entity = row[0]
+        if row.start_time is None:
+            continue
+        show = {
+            prefix + '_id': row[2],
+            prefix + '_name': row[3],
+            prefix + '_image_link': row[4],
+            'start_time': row.start_time
+        }
+        if row.start_time >= now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+
+    if entity is None:
+        abort(404)
+
+    data = {column.name: getattr(entity, column.name)
+            for column in model.__table__.columns}
+    data.update(
+        upcoming_shows=upcoming_shows,
+        upcoming_shows_count=len(upcoming_shows),
+        past_shows=past_shows,
+        past_shows_count=len(past_shows)
+    )
+    return data
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -196,6 +334,8 @@ def create_venue_submission():
         )
         db.session.add(new_venue)
         db.session.commit()
+        update_name_index(Venue, new_venue.id, new_venue.name)
+        cache.delete('areas')
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except:
         error = True
@@ -212,6 +352,8 @@ def delete_venue(venue_id):
     try:
         Venue.query.filter_by(id=venue_id).delete()
         db.session.commit()
+        update_name_index(Venue, int(venue_id))
+        cache.delete('areas', 'venue:{}'.format(venue_id))
     except:
         db.session.rollback()
     finally:
@@ -233,34 +375,15 @@ def artists():
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    search_str = request.form.get('search_term')
-    artist_search = Artist.query.filter(
-        Artist.name.ilike('%{}%'.format(search_str)))
-    artist_list = list(artist_search)
-    response = {
-        "count": len(artist_list),
-        "data": artist_list
-    }
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''), artist_query=Artist.query.filter(
-        Artist.name.ilike('%{}%'.format('search_term'))))
+    search_term = request.form.get('search_term', '')
+    response = search_by_name(Artist, search_term)
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-    now = datetime.utcnow()
-    artist = Artist.query.get(artist_id)
-    artist.upcoming_shows_count = db.session.query(Show).join(
-        Venue, Show.venue_id == Venue.id).filter(
-        Show.artist_id == artist_id, Show.start_time >= now).count()
-    artist.upcoming_shows = db.session.query(Show).join(
-        Venue, Show.venue_id == Venue.id).add_columns(Venue.name.label("venue_name"), Show.start_time, Show.venue_id).filter(
-        Show.artist_id == artist_id, Show.start_time >= now).all()
-    artist.past_shows_count = db.session.query(Show).join(
-        Venue, Show.venue_id == Venue.id).filter(
-        Show.artist_id == artist_id, Show.start_time < now).count()
-    artist.past_shows = db.session.query(Show).join(
-        Venue, Show.venue_id == Venue.id).add_columns(
-        Venue.name.label("venue_name"), Show.start_time, Show.venue_id).filter(Show.artist_id == artist_id, Show.start_time < now).all()
+    artist = cache.get_or_load('artist:{}'.format(artist_id), lambda: load_show_timeline(
+        Artist, artist_id, Show.artist_id, Venue, Show.venue_id, 'venue'))
     return render_template('pages/show_artist.html', artist=artist)
 
 
@@ -336,6 +459,7 @@ def create_artist_submission():
         )
         db.session.add(new_artist)
         db.session.commit()
+        update_name_index(Artist, new_artist.id, new_artist.name)
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except:
         error = True
@@ -352,22 +476,56 @@ def create_artist_submission():
 
 @app.route('/shows')
 def shows():
-    # TODO: num_shows should be aggregated based on number of upcoming shows per venue.
-    result = []
-    shows = Show.query.join(Venue, Show.venue_id == Venue.id).join(
-        Artist, Artist.id == Show.artist_id).all()
-    for show in shows:
-        print(show.artist.name)
-        showObj = {"venue_id": show.venue_id,
-                   "venue_name": show.venue.name,
-                   "artist_id": show.artist_id,
-                   "artist_name": show.artist.name,
-                   "artist_image_link": show.artist.image_link,
-                   "start_time": show.start_time
-                   }
-        result.append(showObj)
+    per_page = min(request.args.get(
+        'per_page', app.config['SHOWS_PER_PAGE'], type=int), app.config['SHOWS_MAX_PER_PAGE'])
+    if per_page < 1:
+        abort(400)
+    cursor = request.args.get('cursor')
+
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Artist.id == Show.artist_id
+    ).filter(Show.start_time.isnot(None))
+    if cursor:
+        query = query.filter(
+            tuple_(Show.start_time, Show.id) > decode_show_cursor(cursor))
+    # One extra row tells whether there is a next page.
+    rows = query.order_by(Show.start_time, Show.id).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_show_cursor(rows[-1])
+
+    result = [{"venue_id": row.venue_id,
+               "venue_name": row.venue_name,
+               "artist_id": row.artist_id,
+               "artist_name": row.artist_name,
+               "artist_image_link": row.artist_image_link,
+               "start_time": row.start_time
+               } for row in rows]
     form = ShowForm()
-    return render_template('pages/shows.html', shows=result, form=form)
+    return render_template('pages/shows.html', shows=result, form=form,
+                           next_cursor=next_cursor, per_page=per_page)
+
+
+def encode_show_cursor(row):
+    return '{}_{}'.format(row.start_time.isoformat(), row.id)
+
+
+def decode_show_cursor(cursor):
+    try:
+        start_time, id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(start_time), int(id)
+    except ValueError:
+        abort(400)
 
 
 @app.route('/shows/create')
@@ -389,6 +547,8 @@ def create_show_submission():
         )
         db.session.add(new_show)
         db.session.commit()
+        cache.delete('areas', 'venue:{}'.format(new_show.venue_id),
+                     'artist:{}'.format(new_show.artist_id))
         flash('Show was successfully listed!')
     except:
         error = True
@@ -399,6 +559,181 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+#  Bulk import
+#  ----------------------------------------------------------------
+
+def check_show_batch(records):
+    # Show ids arrive as strings from the form; convert them and reject rows
+    # pointing at unknown venues or artists with one lookup per batch.
+    rejected = {}
+    for index, record in enumerate(records):
+        try:
+            record['venue_id'] = int(record['venue_id'])
+            record['artist_id'] = int(record['artist_id'])
+        except (TypeError, ValueError):
+            rejected[index] = {'row': ['venue_id and artist_id must be integers']}
+    valid = [record for index, record in enumerate(records)
+             if index not in rejected]
+    venue_ids = {id for id, in db.session.query(Venue.id).filter(
+        Venue.id.in_({record['venue_id'] for record in valid}))}
+    artist_ids = {id for id, in db.session.query(Artist.id).filter(
+        Artist.id.in_({record['artist_id'] for record in valid}))}
+    for index, record in enumerate(records):
+        if index in rejected:
+            continue
+        errors = {}
+        if record['venue_id'] not in venue_ids:
+            errors['venue_id'] = ['Unknown venue']
+        if record['artist_id'] not in artist_ids:
+            errors['artist_id'] = ['Unknown artist']
+        if errors:
+            rejected[index] = errors
+    return rejected
+
+
+def venues_imported(records):
+    name_indexes.pop(Venue, None)
+    cache.delete('areas')
+
+
+def artists_imported(records):
+    name_indexes.pop(Artist, None)
+
+
+def shows_imported(records):
+    keys = {'areas'}
+    for record in records:
+        keys.add('venue:{}'.format(record['venue_id']))
+        keys.add('artist:{}'.format(record['artist_id']))
+    cache.delete(*keys)
+
+
+IMPORTS = {
+    'venues': (Venue, VenueForm, None, venues_imported),
+    'artists': (Artist, ArtistForm, None, artists_imported),
+    'shows': (Show, ShowForm, check_show_batch, shows_imported),
+}
+
+
+def make_importer(kind, batch_size):
+    model, form_class, check_batch, on_commit = IMPORTS[kind]
+    return BulkImporter(db, model, form_class, batch_size=batch_size,
+                        check_batch=check_batch, on_commit=on_commit)
+
+
+@app.route('/venues/import', methods=['POST'], defaults={'kind': 'venues'})
+@app.route('/artists/import', methods=['POST'], defaults={'kind': 'artists'})
+@app.route('/shows/import', methods=['POST'], defaults={'kind': 'shows'})
+def bulk_import(kind):
+    # Accepts a multipart 'file' upload or a raw request body, read line by
+    # line, and answers with one JSON line per rejected row and per committed
+    # batch followed by the summary.
+    upload = request.files.get('file')
+    format = request.args.get('format') or format_for(
+        upload.filename if upload else None)
+    if format not in FORMATS:
+        abort(400)
+    batch_size = request.args.get(
+        'batch_size', app.config['IMPORT_BATCH_SIZE'], type=int)
+    importer = make_importer(kind, batch_size)
+
+    if upload:
+        # Uploaded files are closed with the request, before the response is
+        # streamed; keep a copy of the raw upload for the importer.
+        stream = tempfile.TemporaryFile()
+        shutil.copyfileobj(upload.stream, stream)
+        stream.seek(0)
+    else:
+        stream = request.stream
+    rows = read_rows(codecs.iterdecode(stream, 'utf-8'), format)
+
+    def events():
+        try:
+            for event in importer.run(rows):
+                yield json.dumps(event) + '\n'
+            yield json.dumps(importer.summary()) + '\n'
+        finally:
+            if upload:
+                stream.close()
+
+    return Response(stream_with_context(events()),
+                    mimetype='application/x-ndjson')
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(FORMATS),
+              help='Defaults to the file extension.')
+@click.option('--batch-size', default=None, type=int)
+def import_command(kind, path, format, batch_size):
+    """Bulk import venues, artists or shows from CSV or JSON Lines."""
+    importer = make_importer(
+        kind, batch_size or app.config['IMPORT_BATCH_SIZE'])
+    with open(path, newline='', encoding='utf-8') as stream:
+        for event in importer.run(read_rows(stream, format or format_for(path))):
+            if 'errors' in event:
+                click.echo('line {line}: {errors}'.format(**event), err=True)
+            else:
+                click.echo('{rows} rows read, {inserted} inserted'.format(
+                    **event), err=True)
+    click.echo(json.dumps(importer.summary()))
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+EXPORTS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+
+
+def export_query(kind):
+    table = EXPORTS[kind].__table__
+    columns = table.columns.keys()
+    query = db.session.query(*table.columns).order_by(table.c.id)
+    return query, columns
+
+
+@app.route('/venues/export', defaults={'kind': 'venues'})
+@app.route('/artists/export', defaults={'kind': 'artists'})
+@app.route('/shows/export', defaults={'kind': 'shows'})
+def export(kind):
+    format = request.args.get('format', 'csv')
+    if format not in FORMATS:
+        abort(400)
+    query, columns = export_query(kind)
+    chunks = export_chunks(query, columns, format,
+                           app.config['EXPORT_CHUNK_SIZE'])
+    response = Response(stream_with_context(chunks), mimetype=MIMETYPES[format])
+    response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(
+        kind, format)
+    return response
+
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'format', type=click.Choice(FORMATS), default='csv')
+@click.option('--output', type=click.File('w'), default='-',
+              help='Defaults to standard output.')
+def export_command(kind, format, output):
+    """Export all venues, artists or shows as CSV or JSON Lines."""
+    query, columns = export_query(kind)
+    for chunk in export_chunks(query, columns, format,
+                               app.config['EXPORT_CHUNK_SIZE']):
+        output.write(chunk)
+
+
+#  Monitoring
+#  ----------------------------------------------------------------
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats())
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,170 @@
+#----------------------------------------------------------------------------#
+# Seeds a scratch database with synthetic venues, artists and shows and
+# reports query plans and latency of the listing and detail pages, first
+# without and then with the Show/Venue lookup indexes.
+#
+#   $ python benchmark.py postgresql://localhost:5432/fyyur_bench --shows 200000
+#
+# The target database is dropped and recreated: never point it at real data.
+#----------------------------------------------------------------------------#
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+
+import config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark Fyyur pages with and without lookup indexes.')
+    parser.add_argument('database_url', help='scratch Postgres database')
+    parser.add_argument('--venues', type=int, default=5000)
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--areas', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='requests per page and phase')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def chunked(rows, size=5000):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def seed(db, Venue, Artist, Show, args):
+    rnd = random.Random(args.seed)
+    areas = [('City {}'.format(i), 'S{}'.format(i % 50))
+             for i in range(args.areas)]
+    venues = []
+    for i in range(1, args.venues + 1):
+        city, state = rnd.choice(areas)
+        venues.append({'id': i, 'name': 'Venue {}'.format(i), 'city': city,
+                       'state': state, 'genres': ['Jazz'],
+                       'image_link': 'https://example.com/v{}.jpg'.format(i)})
+    artists = [{'id': i, 'name': 'Artist {}'.format(i), 'city': 'City',
+                'state': 'S0', 'genres': ['Rock'],
+                'image_link': 'https://example.com/a{}.jpg'.format(i)}
+               for i in range(1, args.artists + 1)]
+    now = datetime.utcnow()
+    shows = [{'id': i,
+              'venue_id': rnd.randint(1, args.venues),
+              'artist_id': rnd.randint(1, args.artists),
+              'start_time': now + timedelta(minutes=rnd.randint(-525600, 525600))}
+             for i in range(1, args.shows + 1)]
+    for table, rows in ((Venue.__table__, venues), (Artist.__table__, artists),
+                        (Show.__table__, shows)):
+        for chunk in chunked(rows):
+            db.session.execute(table.insert(), chunk)
+    db.session.commit()
+
+
+def lookup_indexes(Venue, Show):
+    return [index for table in (Venue.__table__, Show.__table__)
+            for index in table.indexes if not index.name.endswith('_trgm')]
+
+
+def capture_statements(db, client, url):
+    # Records the SQL emitted while serving url so its plan can be shown.
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+    return statements
+
+
+def explain(db, statement, parameters):
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN ANALYZE ' + statement, parameters)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+    finally:
+        connection.close()
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run_phase(db, client, pages, repeat, label):
+    print('=' * 78)
+    print(label)
+    print('=' * 78)
+    for name, url in pages:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, (url, response.status_code)
+        print('{:<16} p50 {:8.2f} ms   p95 {:8.2f} ms'.format(
+            name, percentile(samples, 0.5), percentile(samples, 0.95)))
+    for name, url in pages:
+        print('-' * 78)
+        print('{} ({})'.format(name, url))
+        for statement, parameters in capture_statements(db, client, url):
+            if statement.lstrip().upper().startswith('SELECT'):
+                print(explain(db, statement, parameters))
+
+
+def main():
+    args = parse_args()
+    config.SQLALCHEMY_DATABASE_URI = args.database_url
+    config.DEBUG = True
+    # Time the queries, not page cache hits.
+    config.CACHE_BACKEND = 'none'
+    from app import app, db, Venue, Artist, Show
+
+    rnd = random.Random(args.seed + 1)
+    pages = [
+        ('venues', '/venues'),
+        ('venue detail', '/venues/{}'.format(rnd.randint(1, args.venues))),
+        ('artist detail', '/artists/{}'.format(rnd.randint(1, args.artists))),
+        ('shows', '/shows'),
+    ]
+
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        db.session.commit()
+        db.create_all()
+        started = time.perf_counter()
+        seed(db, Venue, Artist, Show, args)
+        print('seeded {} venues, {} artists, {} shows in {:.1f}s'.format(
+            args.venues, args.artists, args.shows, time.perf_counter() - started))
+
+        indexes = lookup_indexes(Venue, Show)
+        client = app.test_client()
+
+        for index in indexes:
+            index.drop(db.engine)
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        run_phase(db, client, pages, args.repeat, 'without lookup indexes')
+
+        for index in indexes:
+            index.create(db.engine)
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        run_phase(db, client, pages, args.repeat, 'with lookup indexes')
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
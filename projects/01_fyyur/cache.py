@@ -0,0 +1,131 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class BaseCache(object):
+    '''
+    Result cache shared by the page handlers.
+    Subclasses implement _get/_set/_delete; hits and misses are counted here.
+    '''
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        found, value = self._get(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = loader()
+        self._set(key, value)
+        return value
+
+    def delete(self, *keys):
+        for key in keys:
+            self._delete(key)
+
+    def stats(self):
+        return {
+            'backend': type(self).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class LRUCache(BaseCache):
+    '''
+    In-process cache holding up to max_entries values for ttl seconds,
+    evicting the least recently used entry first.
+    '''
+
+    def __init__(self, max_entries=1024, ttl=300):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, value
+
+    def _set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def _delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(entries=len(self.entries), evictions=self.evictions)
+        return stats
+
+
+class RedisCache(BaseCache):
+    '''
+    Cache stored in a Redis-compatible server, shared between workers.
+    Values are pickled and expire after ttl seconds.
+    '''
+
+    def __init__(self, url, ttl=300, prefix='fyyur:'):
+        super().__init__()
+        # Optional dependency, only needed when this backend is configured.
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _get(self, key):
+        data = self.client.get(self.prefix + key)
+        if data is None:
+            return False, None
+        return True, pickle.loads(data)
+
+    def _set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def _delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class NullCache(BaseCache):
+    '''
+    Caches nothing: every lookup loads. For benchmarks and debugging.
+    '''
+
+    def _get(self, key):
+        return False, None
+
+    def _set(self, key, value):
+        pass
+
+    def _delete(self, key):
+        pass
+
+
+def make_cache(config):
+    if config.get('CACHE_BACKEND') == 'none':
+        return NullCache()
+    if config.get('CACHE_BACKEND') == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'], ttl=config['CACHE_TTL'])
+    return LRUCache(max_entries=config['CACHE_MAX_ENTRIES'],
+                    ttl=config['CACHE_TTL'])
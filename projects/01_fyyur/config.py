@@ -13,4 +13,46 @@ class config(object):
 
 # TODO IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = "postgres://eva@localhost:5432/fyyur"
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Maximum number of venues/artists returned by a search request
+SEARCH_RESULTS_LIMIT = 20
+
+# Page size of the /shows listing (overridable with ?per_page= up to the maximum)
+SHOWS_PER_PAGE = 30
+SHOWS_MAX_PER_PAGE = 100
+
+# Page result cache: 'memory' (per-process LRU), 'redis' (needs the redis
+# package) or 'none' (disabled)
+CACHE_BACKEND = 'memory'
+CACHE_REDIS_URL = 'redis://localhost:6379/0'
+CACHE_TTL = 300
+CACHE_MAX_ENTRIES = 1024
+
+# Locales for date formatting, selectable with ?locale= or a 'locale' cookie
+DEFAULT_LOCALE = 'en'
+LOCALES = ['en', 'de', 'es', 'fr', 'it', 'pt']
+
+# Rows inserted per transaction by the bulk import endpoints and CLI
+IMPORT_BATCH_SIZE = 1000
+
+# Rows fetched per server-side cursor round-trip by the export endpoints and CLI
+EXPORT_CHUNK_SIZE = 1000
+
+# SQL instrumentation: queries allowed per request (per endpoint overrides,
+# None for no limit), repeats of one statement reported as a possible N+1,
+# and whether exceeding a budget fails the request (enable in tests).
+# Streamed responses (export) are checked once their body has been sent.
+SQL_QUERY_BUDGET = 20
+SQL_QUERY_BUDGETS = {
+    'venues': 1,
+    'show_venue': 1,
+    'show_artist': 1,
+    'shows': 1,
+    'search_venues': 2,
+    'search_artists': 2,
+    'export': 1,
+    'bulk_import': None,
+}
+SQL_DUPLICATE_THRESHOLD = 3
+SQL_QUERY_BUDGET_STRICT = False
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from importer import FORMATS
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def plain(value):
+    # Same representation the importer reads back.
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+def csv_cell(value):
+    if isinstance(value, (list, tuple)):
+        return ','.join(value)
+    if isinstance(value, bool):
+        # What a checked/unchecked BooleanField reads back; 'False' would
+        # read as checked.
+        return 'y' if value else ''
+    return plain(value)
+
+
+def export_chunks(query, columns, format, chunk_size=1000):
+    '''
+    Yields the rows of query serialized as CSV or JSON Lines, chunk_size rows
+    per string. Rows are fetched through a server-side cursor, chunk_size at
+    a time, so memory use does not depend on the size of the table.
+    '''
+    if format not in FORMATS:
+        raise ValueError('Unsupported export format: {}'.format(format))
+
+    rows = query.execution_options(stream_results=True).yield_per(chunk_size)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if format == 'csv' else None
+    if writer is not None:
+        writer.writerow(columns)
+
+    count = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow([csv_cell(value) for value in row])
+        else:
+            buffer.write(json.dumps(
+                {column: plain(value) for column, value in zip(columns, row)}))
+            buffer.write('\n')
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
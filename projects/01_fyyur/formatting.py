@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import babel.dates
+from babel import Locale, UnknownLocaleError
+
+DATETIME_PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+class DatetimeFormatter(object):
+    '''
+    Formats datetimes for the templates.
+    Patterns are compiled once and Locale objects resolved once per locale,
+    instead of on every call to babel.dates.format_datetime.
+    '''
+
+    def __init__(self, default_locale='en', patterns=DATETIME_PATTERNS):
+        self.default_locale = default_locale
+        self.patterns = patterns
+        self.compiled = {}
+        self.locales = {}
+
+    def locale(self, identifier=None):
+        identifier = identifier or self.default_locale
+        locale = self.locales.get(identifier)
+        if locale is None:
+            try:
+                locale = Locale.parse(identifier)
+            except (UnknownLocaleError, ValueError, TypeError):
+                return self.locale(self.default_locale)
+            self.locales[identifier] = locale
+        return locale
+
+    def pattern(self, format):
+        compiled = self.compiled.get(format)
+        if compiled is None:
+            compiled = babel.dates.parse_pattern(
+                self.patterns.get(format, format))
+            self.compiled[format] = compiled
+        return compiled
+
+    def format(self, value, format='medium', locale=None):
+        return self.format_many([value], format, locale)[0]
+
+    def format_many(self, values, format='medium', locale=None):
+        pattern = self.pattern(format)
+        locale = self.locale(locale)
+        formatted = []
+        for value in values:
+            if isinstance(value, datetime):
+                formatted.append(pattern.apply(value, locale))
+            else:
+                # Strings, timestamps and None keep babel's own handling.
+                formatted.append(babel.dates.format_datetime(
+                    value, self.patterns.get(format, format), locale=locale))
+        return formatted
@@ -0,0 +1,130 @@
+import csv
+import json
+
+from werkzeug.datastructures import MultiDict
+
+FORMATS = ('csv', 'jsonl')
+
+
+def read_rows(stream, format):
+    '''
+    Yields one dict per record of a text stream, without reading it whole.
+    CSV multi-valued fields (genres) are comma separated inside their cell.
+    '''
+    if format == 'csv':
+        for row in csv.DictReader(stream):
+            if row.get('genres'):
+                row['genres'] = [genre.strip()
+                                 for genre in row['genres'].split(',')]
+            yield row
+    elif format == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError('Unsupported import format: {}'.format(format))
+
+
+def format_for(filename, default='jsonl'):
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in FORMATS:
+        return extension
+    if extension in ('json', 'ndjson'):
+        return 'jsonl'
+    return default
+
+
+def as_formdata(row):
+    items = []
+    for key, value in row.items():
+        if isinstance(value, (list, tuple)):
+            items.extend((key, str(item)) for item in value)
+        elif value is True:
+            items.append((key, 'y'))
+        elif value is not None and value is not False:
+            items.append((key, str(value)))
+    return MultiDict(items)
+
+
+class BulkImporter(object):
+    '''
+    Validates rows with a WTForms form class and inserts the valid ones in
+    batches, one transaction and one executemany per batch.
+
+    run() yields progress events as dicts:
+        {'line': n, 'errors': {...}}            for every rejected row
+        {'rows': n, 'inserted': m}              after every committed batch
+    '''
+
+    def __init__(self, db, model, form_class, batch_size=1000, check_batch=None, on_commit=None):
+        self.db = db
+        self.table = model.__table__
+        self.form_class = form_class
+        self.batch_size = batch_size
+        # Optional callable(records) -> {index: errors} for checks that need
+        # the database, e.g. foreign keys, done once per batch.
+        self.check_batch = check_batch
+        # Optional callable(records) run after each committed batch.
+        self.on_commit = on_commit
+        self.columns = set(self.table.columns.keys()) - {'id'}
+        self.inserted = 0
+        self.failed = 0
+
+    def validate(self, row):
+        form = self.form_class(formdata=as_formdata(row), meta={'csrf': False})
+        valid = form.validate()
+        # A required field absent from the row is missing, even when the form
+        # has a default for it (ShowForm.start_time defaults to import time).
+        missing = {field.name: ['This field is required.'] for field in form
+                   if field.flags.required and not field.raw_data}
+        if not valid or missing:
+            return None, dict(form.errors, **missing)
+        record = {key: value for key, value in form.data.items()
+                  if key in self.columns}
+        return record, None
+
+    def run(self, rows):
+        batch = []
+        line = 0
+        for line, row in enumerate(rows, start=1):
+            try:
+                record, errors = self.validate(row)
+            except (TypeError, ValueError, AttributeError) as e:
+                record, errors = None, {'row': [str(e)]}
+            if errors:
+                self.failed += 1
+                yield {'line': line, 'errors': errors}
+                continue
+            batch.append((line, record))
+            if len(batch) >= self.batch_size:
+                yield from self.flush(batch, line)
+                batch = []
+        if batch:
+            yield from self.flush(batch, line)
+
+    def flush(self, batch, line):
+        if self.check_batch is not None:
+            rejected = self.check_batch([record for _, record in batch])
+            for index in sorted(rejected):
+                self.failed += 1
+                yield {'line': batch[index][0], 'errors': rejected[index]}
+            batch = [item for index, item in enumerate(batch)
+                     if index not in rejected]
+        if batch:
+            try:
+                self.db.session.execute(
+                    self.table.insert(), [record for _, record in batch])
+                self.db.session.commit()
+            except Exception as e:
+                self.db.session.rollback()
+                self.failed += len(batch)
+                for batch_line, _ in batch:
+                    yield {'line': batch_line, 'errors': {'batch': [str(e)]}}
+                return
+            self.inserted += len(batch)
+            if self.on_commit is not None:
+                self.on_commit([record for _, record in batch])
+        yield {'rows': line, 'inserted': self.inserted}
+
+    def summary(self):
+        return {'inserted': self.inserted, 'failed': self.failed}
@@ -0,0 +1,138 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, name, stats, budget):
+        self.name = name
+        self.stats = stats
+        self.budget = budget
+        super().__init__('{} ran {} queries, budget is {}'.format(
+            name, stats.count, budget))
+
+
+def fingerprint(statement):
+    '''
+    Normalizes a statement so that repetitions differing only in parameter
+    values or IN-list length share one fingerprint.
+    '''
+    statement = re.sub(r'\s+', ' ', statement.strip())
+    statement = re.sub(r"'(?:[^']|'')*'", '?', statement)
+    statement = re.sub(r'\b\d+\b', '?', statement)
+    statement = re.sub(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,?)+\)', '(?)', statement)
+    return statement
+
+
+class QueryStats(object):
+    '''
+    Queries issued while serving one request (or inside collect_queries()).
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def duplicates(self, threshold=2):
+        return [(statement, count)
+                for statement, count in self.fingerprints.most_common()
+                if count >= threshold]
+
+
+def _active_stats():
+    active = list(getattr(_local, 'collectors', ()))
+    if has_app_context():
+        stats = g.get('query_stats')
+        if stats is not None:
+            active.append(stats)
+    return active
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start_time'].pop()
+    for stats in _active_stats():
+        stats.record(statement, duration)
+
+
+@contextmanager
+def collect_queries():
+    '''
+    Collects the queries run inside the block, e.g. in tests:
+
+        with collect_queries() as stats:
+            client.get('/venues')
+        assert stats.count <= 2
+    '''
+    stats = QueryStats()
+    collectors = _local.__dict__.setdefault('collectors', [])
+    collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        collectors.remove(stats)
+
+
+def init_instrumentation(app):
+    '''
+    Records query count, database time and repeated statements per request.
+    Requests over their budget (SQL_QUERY_BUDGETS per endpoint, where None
+    means unlimited, else SQL_QUERY_BUDGET) or repeating one statement
+    SQL_DUPLICATE_THRESHOLD times are logged through app.logger; with
+    SQL_QUERY_BUDGET_STRICT a budget overrun raises QueryBudgetExceeded,
+    failing the request in tests. Streamed responses are checked once their
+    body has been sent, when the response is closed.
+    '''
+
+    def check_query_stats(name, stats):
+        budget = app.config['SQL_QUERY_BUDGETS'].get(
+            name, app.config['SQL_QUERY_BUDGET'])
+        for statement, count in stats.duplicates(app.config['SQL_DUPLICATE_THRESHOLD']):
+            app.logger.warning('Possible N+1 in %s: %d x %s',
+                               name, count, statement)
+        if budget is not None and stats.count > budget:
+            app.logger.warning('%s ran %d queries (%.1f ms), budget is %d',
+                               name, stats.count, stats.duration * 1000, budget)
+            if app.config['SQL_QUERY_BUDGET_STRICT']:
+                raise QueryBudgetExceeded(name, stats, budget)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        name = request.endpoint or request.path
+        if response.is_streamed:
+            # The body's queries (export, bulk_import) run after this hook,
+            # while it is sent; g.query_stats keeps collecting them.
+            response.call_on_close(lambda: check_query_stats(name, stats))
+            return response
+
+        g.pop('query_stats')
+        response.headers['Server-Timing'] = 'db;desc="{} queries";dur={:.1f}'.format(
+            stats.count, stats.duration * 1000)
+        check_query_stats(name, stats)
+        return response
@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+
+def trigrams(text, padded=True):
+    text = (text or '').lower()
+    if padded:
+        text = '  ' + text + ' '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(a, b):
+    # Same measure as pg_trgm's similarity(): shared trigrams over all trigrams.
+    grams_a = trigrams(a)
+    grams_b = trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+class NgramIndex(object):
+    '''
+    In-process trigram index over (id, name) pairs.
+    Used for name search when the database has no pg_trgm support (e.g. SQLite).
+    Matches names containing the term, ranked by trigram similarity.
+    '''
+
+    def __init__(self, rows=()):
+        self.names = {}
+        self.postings = defaultdict(set)
+        for id, name in rows:
+            self.add(id, name)
+
+    def add(self, id, name):
+        self.remove(id)
+        if name is None:
+            return
+        self.names[id] = name
+        for gram in trigrams(name, padded=False):
+            self.postings[gram].add(id)
+
+    def remove(self, id):
+        name = self.names.pop(id, None)
+        if name is None:
+            return
+        for gram in trigrams(name, padded=False):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.postings[gram]
+
+    def candidates(self, term):
+        grams = trigrams(term, padded=False)
+        if not grams:
+            # Terms shorter than a trigram cannot use the postings.
+            return self.names.keys()
+        sets = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        return set.intersection(*sets)
+
+    def search(self, term, limit=None, offset=0):
+        '''
+        Returns (total, [(id, name), ...]) for the names containing term,
+        best matches first.
+        '''
+        term = (term or '').lower()
+        matches = [id for id in self.candidates(term)
+                   if term in self.names[id].lower()]
+        matches.sort(key=lambda id: (-similarity(term, self.names[id]), id))
+        end = None if limit is None else offset + limit
+        return len(matches), [(id, self.names[id]) for id in matches[offset:end]]
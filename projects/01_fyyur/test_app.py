@@ -0,0 +1,169 @@
+#----------------------------------------------------------------------------#
+# Query budget and /shows paging tests for the listing and detail pages.
+#
+#   $ FYYUR_TEST_DATABASE_URL=postgresql://localhost:5432/fyyur_test \
+#       python -m unittest test_app
+#
+# The target database's tables are dropped and recreated: never point it at
+# real data.
+#----------------------------------------------------------------------------#
+
+import os
+import unittest
+import urllib.parse
+from datetime import datetime, timedelta
+
+import config
+
+config.SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'FYYUR_TEST_DATABASE_URL', 'postgresql://localhost:5432/fyyur_test')
+# Every request must reach the database, and any request over its budget
+# fails instead of being logged.
+config.CACHE_BACKEND = 'none'
+config.SQL_QUERY_BUDGET_STRICT = True
+config.TESTING = True
+
+from app import app, db, Venue, Artist, Show, decode_show_cursor
+from instrumentation import QueryBudgetExceeded, collect_queries
+
+VENUES = 6
+ARTISTS = 4
+SHOWS = 40
+
+
+def seed():
+    db.session.execute(Venue.__table__.insert(), [
+        {'id': id, 'name': 'Venue {}'.format(id),
+         'city': 'City {}'.format(id % 3), 'state': 'CA', 'genres': ['Jazz'],
+         'image_link': 'https://example.com/v{}.jpg'.format(id)}
+        for id in range(1, VENUES + 1)])
+    db.session.execute(Artist.__table__.insert(), [
+        {'id': id, 'name': 'Artist {}'.format(id), 'city': 'City 0',
+         'state': 'CA', 'genres': ['Rock'],
+         'image_link': 'https://example.com/a{}.jpg'.format(id)}
+        for id in range(1, ARTISTS + 1)])
+    now = datetime.utcnow()
+    # Past and upcoming shows, spread over every venue and artist.
+    db.session.execute(Show.__table__.insert(), [
+        {'id': id, 'venue_id': id % VENUES + 1, 'artist_id': id % ARTISTS + 1,
+         'start_time': now + timedelta(days=id - SHOWS // 2)}
+        for id in range(1, SHOWS + 1)])
+    db.session.commit()
+
+
+def setUpModule():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed()
+
+
+def tearDownModule():
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+class QueryBudgetTestCase(unittest.TestCase):
+    """Pages must not issue more queries as venues, artists and shows grow."""
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def assertWithinBudget(self, url, endpoint):
+        with collect_queries() as stats:
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertLessEqual(stats.count,
+                             app.config['SQL_QUERY_BUDGETS'][endpoint])
+        return res
+
+    def test_venues(self):
+        res = self.assertWithinBudget('/venues', 'venues')
+        self.assertIn(b'Venue 6', res.data)
+
+    def test_show_venue(self):
+        for venue_id in (1, VENUES):
+            self.assertWithinBudget('/venues/{}'.format(venue_id), 'show_venue')
+
+    def test_show_artist(self):
+        self.assertWithinBudget('/artists/1', 'show_artist')
+
+    def test_shows(self):
+        res = self.assertWithinBudget('/shows', 'shows')
+        self.assertIn(b'Artist 1', res.data)
+        self.assertWithinBudget('/shows?per_page=5', 'shows')
+
+    def test_over_budget_fails_the_request(self):
+        budgets = app.config['SQL_QUERY_BUDGETS']
+        app.config['SQL_QUERY_BUDGETS'] = dict(budgets, venues=0)
+        try:
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/venues')
+        finally:
+            app.config['SQL_QUERY_BUDGETS'] = budgets
+
+    def test_streamed_export_is_checked(self):
+        # An export runs its query while the body is sent, after the
+        # request hooks; it is checked when the response is closed.
+        with self.client.get('/venues/export?format=jsonl') as res:
+            self.assertEqual(res.data.count(b'\n'), VENUES)
+
+        budgets = app.config['SQL_QUERY_BUDGETS']
+        app.config['SQL_QUERY_BUDGETS'] = dict(budgets, export=0)
+        try:
+            with self.assertRaises(QueryBudgetExceeded):
+                with self.client.get('/venues/export?format=jsonl') as res:
+                    res.data
+        finally:
+            app.config['SQL_QUERY_BUDGETS'] = budgets
+
+
+class ShowsCursorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_bad_cursor(self):
+        for cursor in ('garbage', 'not-a-date_1', '2030-01-01T10:00:00_x'):
+            res = self.client.get('/shows', query_string={'cursor': cursor})
+            self.assertEqual(res.status_code, 400, cursor)
+
+    def test_bad_per_page(self):
+        res = self.client.get('/shows?per_page=0')
+        self.assertEqual(res.status_code, 400)
+
+    def test_decode(self):
+        self.assertEqual(decode_show_cursor('2030-01-01T10:00:00_7'),
+                         (datetime(2030, 1, 1, 10), 7))
+
+    def test_pages_cover_every_show_once(self):
+        # Follows the "More shows" links, whose cursors are decoded back.
+        query = {'per_page': 7}
+        shown = []
+        while True:
+            res = self.client.get('/shows', query_string=query)
+            self.assertEqual(res.status_code, 200)
+            shown.append(res.data.count(b'tile-show'))
+            cursor = self.next_cursor(res)
+            if cursor is None:
+                break
+            query['cursor'] = cursor
+
+        self.assertEqual(sum(shown), SHOWS)
+        self.assertEqual(len(shown), -(-SHOWS // 7))
+
+    @staticmethod
+    def next_cursor(res):
+        marker = b'/shows?cursor='
+        html = res.data
+        if marker not in html:
+            return None
+        start = html.index(marker) + len(marker)
+        encoded = html[start:html.index(b'&', start)].decode()
+        return urllib.parse.unquote(encoded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#----------------------------------------------------------------------------#
+# Tests for the page result caches; no database needed.
+#
+#   $ python -m unittest test_cache
+#----------------------------------------------------------------------------#
+
+import unittest
+
+from cache import LRUCache, NullCache, make_cache
+
+CONFIG = {'CACHE_MAX_ENTRIES': 2, 'CACHE_TTL': 60}
+
+
+class Loader(object):
+    '''Returns value, counting how often the cache had to load it.'''
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = LRUCache()
+        loader = Loader('page')
+
+        self.assertEqual(cache.get_or_load('venues', loader), 'page')
+        self.assertEqual(cache.get_or_load('venues', loader), 'page')
+        self.assertEqual(loader.calls, 1)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['entries'], 1)
+
+    def test_expired_entry_is_loaded_again(self):
+        cache = LRUCache(ttl=-1)
+        loader = Loader('page')
+
+        cache.get_or_load('venues', loader)
+        cache.get_or_load('venues', loader)
+        self.assertEqual(loader.calls, 2)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(max_entries=2)
+        cache.get_or_load('a', Loader(1))
+        cache.get_or_load('b', Loader(2))
+        cache.get_or_load('a', Loader(1))
+        cache.get_or_load('c', Loader(3))
+
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+        loader = Loader(2)
+        cache.get_or_load('b', loader)
+        self.assertEqual(loader.calls, 1)
+
+    def test_delete(self):
+        cache = LRUCache()
+        cache.get_or_load('a', Loader(1))
+        cache.get_or_load('b', Loader(2))
+
+        cache.delete('a', 'b', 'missing')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+class MakeCacheTestCase(unittest.TestCase):
+
+    def test_backends(self):
+        cache = make_cache(CONFIG)
+        self.assertIsInstance(cache, LRUCache)
+        self.assertEqual((cache.max_entries, cache.ttl), (2, 60))
+        self.assertIsInstance(make_cache(dict(CONFIG, CACHE_BACKEND='none')),
+                              NullCache)
+
+    def test_null_cache_always_loads(self):
+        cache = NullCache()
+        loader = Loader('page')
+
+        cache.get_or_load('venues', loader)
+        cache.get_or_load('venues', loader)
+        self.assertEqual(loader.calls, 2)
+        self.assertEqual(cache.stats()['backend'], 'NullCache')
+
+
+if __name__ == '__main__':
+    unittest.main()
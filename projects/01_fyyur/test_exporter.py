@@ -0,0 +1,128 @@
+#----------------------------------------------------------------------------#
+# Tests for the exporter; uses an in-memory SQLite database.
+#
+#   $ python -m unittest test_exporter
+#----------------------------------------------------------------------------#
+
+import io
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import Flask
+from sqlalchemy import (JSON, Boolean, Column, Integer, MetaData, String,
+                        Table, create_engine)
+from sqlalchemy.orm import Session
+
+from exporter import csv_cell, export_chunks, plain
+from forms import VenueForm
+from importer import BulkImporter, read_rows
+
+metadata = MetaData()
+# The Venue table, with genres as JSON: SQLite has no ARRAY.
+venues = Table(
+    'Venue', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String),
+    Column('city', String(120)),
+    Column('state', String(120)),
+    Column('address', String(120)),
+    Column('phone', String(120)),
+    Column('genres', JSON),
+    Column('image_link', String(500)),
+    Column('facebook_link', String(120)),
+    Column('website', String(200)),
+    Column('seeking_talent', Boolean),
+    Column('seeking_description', String(250)))
+Venue = SimpleNamespace(__table__=venues)
+
+
+def venue(id, **values):
+    row = {'id': id, 'name': 'Venue {}'.format(id), 'city': 'San Francisco',
+           'state': 'CA', 'address': '1015 Folsom Street',
+           'phone': '123-123-1234', 'genres': ['Jazz', 'Folk'],
+           'image_link': 'https://example.com/{}.jpg'.format(id),
+           'facebook_link': 'https://www.facebook.com/venue{}'.format(id),
+           'website': 'https://example.com', 'seeking_talent': True,
+           'seeking_description': None}
+    row.update(values)
+    return row
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        metadata.create_all(self.engine)
+        self.session = Session(bind=self.engine)
+        # Forms read their settings from the current app.
+        self.context = Flask(__name__).app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+        self.session.close()
+        self.engine.dispose()
+
+    def export(self, format, chunk_size=1000):
+        self.session.commit()
+        query = self.session.query(*venues.columns).order_by(venues.c.id)
+        return list(export_chunks(query, venues.columns.keys(), format,
+                                  chunk_size))
+
+    def reimport(self, chunks, format):
+        importer = BulkImporter(None, Venue, VenueForm)
+        return [importer.validate(row)
+                for row in read_rows(io.StringIO(''.join(chunks)), format)]
+
+    def test_round_trip(self):
+        self.session.execute(venues.insert(), [
+            venue(1, seeking_talent=True, seeking_description='Jazz trios'),
+            venue(2, seeking_talent=False)])
+        for format in ('csv', 'jsonl'):
+            results = self.reimport(self.export(format), format)
+
+            self.assertEqual([errors for _, errors in results], [None, None])
+            first, second = [record for record, _ in results]
+            self.assertIs(first['seeking_talent'], True, format)
+            self.assertIs(second['seeking_talent'], False, format)
+            self.assertEqual(first['genres'], ['Jazz', 'Folk'], format)
+            self.assertEqual(first['seeking_description'], 'Jazz trios')
+
+    def test_chunks(self):
+        self.session.execute(venues.insert(), [venue(id) for id in range(1, 6)])
+
+        chunks = self.export('jsonl', chunk_size=2)
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [2, 2, 1])
+
+        chunks = self.export('csv', chunk_size=2)
+        lines = ''.join(chunks).splitlines()
+        self.assertEqual(lines[0].split(','), venues.columns.keys())
+        self.assertEqual(len(lines), 6)
+
+    def test_empty_table(self):
+        self.assertEqual(self.export('jsonl'), [])
+        self.assertEqual(self.export('csv'),
+                         [','.join(venues.columns.keys()) + '\r\n'])
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            self.export('xml')
+
+
+class CellTestCase(unittest.TestCase):
+
+    def test_datetimes_in_importer_format(self):
+        value = datetime(2030, 1, 1, 20, 30)
+        self.assertEqual(plain(value), '2030-01-01 20:30:00')
+        self.assertEqual(csv_cell(value), '2030-01-01 20:30:00')
+
+    def test_csv_cells(self):
+        self.assertEqual(csv_cell(['Jazz', 'Folk']), 'Jazz,Folk')
+        self.assertEqual((csv_cell(True), csv_cell(False)), ('y', ''))
+        self.assertIsNone(csv_cell(None))
+        self.assertEqual(csv_cell(7), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
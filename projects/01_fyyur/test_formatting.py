@@ -0,0 +1,66 @@
+#----------------------------------------------------------------------------#
+# Tests for the template datetime formatter; no database needed.
+#
+#   $ python -m unittest test_formatting
+#----------------------------------------------------------------------------#
+
+import unittest
+from datetime import datetime
+
+import babel.dates
+from babel import Locale
+
+from formatting import DATETIME_PATTERNS, DatetimeFormatter
+
+VALUES = [datetime(2019, 5, 21, 21, 30), datetime(2035, 4, 1, 8, 5)]
+
+
+class DatetimeFormatterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.formatter = DatetimeFormatter()
+
+    def test_same_output_as_babel(self):
+        for identifier in ('en', 'en_US', 'fr', 'de', 'ja'):
+            for format, pattern in DATETIME_PATTERNS.items():
+                expected = [babel.dates.format_datetime(
+                    value, pattern, locale=Locale.parse(identifier))
+                    for value in VALUES]
+                self.assertEqual(
+                    self.formatter.format_many(VALUES, format, identifier),
+                    expected, (identifier, format))
+
+    def test_format(self):
+        self.assertEqual(self.formatter.format(VALUES[0], 'full'),
+                         'Tuesday May, 21, 2019 at 9:30PM')
+
+    def test_unknown_locale_falls_back_to_default(self):
+        for identifier in ('xx_YY', 'not a locale', 42):
+            self.assertEqual(self.formatter.locale(identifier),
+                             Locale.parse('en'), identifier)
+        self.assertEqual(self.formatter.format(VALUES[0], 'medium', 'xx_YY'),
+                         self.formatter.format(VALUES[0], 'medium'))
+
+    def test_timestamps_are_left_to_babel(self):
+        self.assertEqual(
+            self.formatter.format(1558474200, 'medium', 'de'),
+            babel.dates.format_datetime(1558474200,
+                                        DATETIME_PATTERNS['medium'],
+                                        locale=Locale.parse('de')))
+
+    def test_pattern_and_locale_resolved_once(self):
+        self.formatter.format_many(VALUES, 'full', 'fr')
+        pattern = self.formatter.compiled['full']
+        locale = self.formatter.locales['fr']
+
+        self.formatter.format_many(VALUES, 'full', 'fr')
+        self.assertIs(self.formatter.pattern('full'), pattern)
+        self.assertIs(self.formatter.locale('fr'), locale)
+
+    def test_pattern_not_in_table_is_used_as_is(self):
+        self.assertEqual(self.formatter.format(VALUES[0], 'y-MM-dd'),
+                         '2019-05-21')
+
+
+if __name__ == '__main__':
+    unittest.main()
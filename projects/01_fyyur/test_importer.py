@@ -0,0 +1,163 @@
+#----------------------------------------------------------------------------#
+# Tests for the bulk importer; no database server needed.
+#
+#   $ python -m unittest test_importer
+#----------------------------------------------------------------------------#
+
+import io
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import Flask
+from sqlalchemy import (Column, DateTime, Integer, MetaData, Table,
+                        UniqueConstraint, create_engine)
+from sqlalchemy.orm import Session
+
+from forms import ShowForm
+from importer import BulkImporter, format_for, read_rows
+
+metadata = MetaData()
+shows = Table(
+    'Show', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('venue_id', Integer, nullable=False),
+    Column('artist_id', Integer, nullable=False),
+    Column('start_time', DateTime),
+    # Not in the app's schema: lets a test make a whole batch fail.
+    UniqueConstraint('venue_id', 'artist_id', 'start_time'))
+Show = SimpleNamespace(__table__=shows)
+
+
+def show(venue_id=1, artist_id=2, start_time='2030-01-01 20:00:00'):
+    return {'venue_id': venue_id, 'artist_id': artist_id,
+            'start_time': start_time}
+
+
+class ReadRowsTestCase(unittest.TestCase):
+
+    def test_csv(self):
+        stream = io.StringIO('name,genres\nThe Hop,"Jazz, Folk"\nThe Bar,\n')
+        self.assertEqual(list(read_rows(stream, 'csv')), [
+            {'name': 'The Hop', 'genres': ['Jazz', 'Folk']},
+            {'name': 'The Bar', 'genres': ''}])
+
+    def test_jsonl_skips_blank_lines(self):
+        stream = io.StringIO('{"name": "The Hop"}\n\n{"name": "The Bar"}\n')
+        self.assertEqual(list(read_rows(stream, 'jsonl')),
+                         [{'name': 'The Hop'}, {'name': 'The Bar'}])
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            list(read_rows(io.StringIO(''), 'xml'))
+
+    def test_format_for(self):
+        self.assertEqual(format_for('shows.CSV'), 'csv')
+        self.assertEqual(format_for('shows.ndjson'), 'jsonl')
+        self.assertEqual(format_for('shows.txt'), 'jsonl')
+        self.assertEqual(format_for(None, default='csv'), 'csv')
+
+
+class ValidateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # Forms read their settings from the current app.
+        self.context = Flask(__name__).app_context()
+        self.context.push()
+        self.importer = BulkImporter(None, Show, ShowForm)
+
+    def tearDown(self):
+        self.context.pop()
+
+    def test_valid_row(self):
+        record, errors = self.importer.validate(
+            {'venue_id': 1, 'artist_id': 2, 'start_time': '2030-01-01 20:00:00'})
+
+        self.assertIsNone(errors)
+        self.assertEqual(record['start_time'], datetime(2030, 1, 1, 20))
+
+    def test_missing_start_time_is_rejected(self):
+        # ShowForm defaults start_time for the web form; an import row
+        # without one must not get that default.
+        record, errors = self.importer.validate({'venue_id': 1, 'artist_id': 2})
+
+        self.assertIsNone(record)
+        self.assertIn('start_time', errors)
+
+    def test_empty_start_time_is_rejected(self):
+        record, errors = self.importer.validate(
+            {'venue_id': 1, 'artist_id': 2, 'start_time': ''})
+
+        self.assertIsNone(record)
+        self.assertIn('start_time', errors)
+
+
+class RunTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        metadata.create_all(self.engine)
+        self.db = SimpleNamespace(session=Session(bind=self.engine))
+        self.context = Flask(__name__).app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+        self.db.session.close()
+        self.engine.dispose()
+
+    def run_import(self, rows, **options):
+        importer = BulkImporter(self.db, Show, ShowForm, **options)
+        return importer, list(importer.run(rows))
+
+    def stored(self):
+        query = self.db.session.query(shows.c.venue_id).order_by(shows.c.id)
+        return [venue_id for venue_id, in query]
+
+    def test_one_event_per_committed_batch(self):
+        importer, events = self.run_import(
+            [show(venue_id=id) for id in range(1, 6)], batch_size=2)
+
+        self.assertEqual(events, [{'rows': 2, 'inserted': 2},
+                                  {'rows': 4, 'inserted': 4},
+                                  {'rows': 5, 'inserted': 5}])
+        self.assertEqual(len(self.stored()), 5)
+        self.assertEqual(importer.summary(), {'inserted': 5, 'failed': 0})
+
+    def test_invalid_rows_are_rejected_by_line(self):
+        rows = [show(), show(start_time='tomorrow'), {'venue_id': 1},
+                show(venue_id=2)]
+        importer, events = self.run_import(rows, batch_size=10)
+
+        self.assertEqual([event.get('line') for event in events[:2]], [2, 3])
+        self.assertIn('start_time', events[0]['errors'])
+        self.assertEqual(events[2], {'rows': 4, 'inserted': 2})
+        self.assertEqual(importer.summary(), {'inserted': 2, 'failed': 2})
+
+    def test_check_batch_rejections(self):
+        committed = []
+        importer, events = self.run_import(
+            [show(venue_id=id) for id in range(1, 4)],
+            check_batch=lambda records: {1: {'venue_id': ['Unknown venue.']}},
+            on_commit=committed.extend)
+
+        self.assertEqual(events[0], {'line': 2,
+                                     'errors': {'venue_id': ['Unknown venue.']}})
+        self.assertEqual(self.stored(), [1, 3])
+        self.assertEqual(len(committed), 2)
+        self.assertEqual(importer.summary(), {'inserted': 2, 'failed': 1})
+
+    def test_failed_batch_is_rolled_back(self):
+        # The last row repeats the first: the second batch fails as a whole.
+        rows = [show(venue_id=id) for id in (1, 2, 3, 1)]
+        importer, events = self.run_import(rows, batch_size=2)
+
+        self.assertEqual(events[0], {'rows': 2, 'inserted': 2})
+        self.assertEqual([event['line'] for event in events[1:]], [3, 4])
+        self.assertIn('batch', events[1]['errors'])
+        self.assertEqual(len(self.stored()), 2)
+        self.assertEqual(importer.summary(), {'inserted': 2, 'failed': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#----------------------------------------------------------------------------#
+# Tests for the in-process trigram name index; no database needed.
+#
+#   $ python -m unittest test_search
+#----------------------------------------------------------------------------#
+
+import unittest
+
+from search import NgramIndex, similarity
+
+NAMES = [
+    (1, 'The Musical Hop'),
+    (2, 'Park Square Live Music & Coffee'),
+    (3, 'The Dueling Pianos Bar'),
+    (4, 'Guns N Petals'),
+]
+
+
+class NgramIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.index = NgramIndex(NAMES)
+
+    def test_substring_match_is_case_insensitive(self):
+        total, matches = self.index.search('music')
+
+        self.assertEqual(total, 2)
+        self.assertEqual(sorted(id for id, _ in matches), [1, 2])
+
+    def test_best_match_first(self):
+        _, matches = self.index.search('Guns N Petals')
+        self.assertEqual(matches, [(4, 'Guns N Petals')])
+
+        # Both contain 'hop'; the shorter name is the closer match.
+        self.index.add(5, 'Hop')
+        _, matches = self.index.search('hop')
+        self.assertEqual([id for id, _ in matches], [5, 1])
+
+    def test_short_terms_scan_every_name(self):
+        total, matches = self.index.search('ee')
+        self.assertEqual(matches, [(2, 'Park Square Live Music & Coffee')])
+        total, _ = self.index.search('')
+        self.assertEqual(total, len(NAMES))
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search('zither'), (0, []))
+
+    def test_limit_and_offset(self):
+        total, first = self.index.search('', limit=2)
+        _, rest = self.index.search('', limit=2, offset=2)
+
+        self.assertEqual(total, 4)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(rest), 2)
+        self.assertFalse(set(first) & set(rest))
+
+    def test_add_rename_and_remove(self):
+        self.index.add(4, 'Guns N Roses')
+        self.assertEqual(self.index.search('petals'), (0, []))
+        self.assertEqual(self.index.search('roses')[0], 1)
+
+        self.index.remove(4)
+        self.assertEqual(self.index.search('roses'), (0, []))
+        # Trigrams only used by the removed name are dropped.
+        self.assertNotIn('ros', self.index.postings)
+        self.index.remove(4)
+
+    def test_none_name_is_not_indexed(self):
+        self.index.add(6, None)
+        self.assertNotIn(6, self.index.names)
+
+
+class SimilarityTestCase(unittest.TestCase):
+
+    def test_bounds(self):
+        self.assertEqual(similarity('jazz', 'jazz'), 1.0)
+        self.assertEqual(similarity('jazz', ''), 0.0)
+        self.assertGreater(similarity('jazz', 'jazzy'), similarity('jazz', 'blues'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,322 @@
+'''
+Load and latency benchmark for the Trivia API.
+
+Seeds synthetic question banks of the given sizes and drives the listing,
+search, per-category and quiz endpoints through the Flask test client and,
+with --server, through a real WSGI server. Reports p50/p95/p99 latency,
+queries per request and peak memory per request, and saves the results as
+JSON so runs can be compared with --compare.
+
+    $ python benchmark.py --sizes 1000 10000 100000 --output after.json
+    $ python benchmark.py postgresql://localhost:5432/trivia_bench --server \
+        --compare after.json
+
+The target database is dropped and recreated: never point it at real data.
+'''
+
+import argparse
+import json
+import platform
+import random
+import resource
+import threading
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from flaskr import create_app
+from models import db, Question, Category
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+              'Sports']
+WORDS = ['river', 'planet', 'painter', 'empire', 'film', 'goal', 'ocean',
+         'novel', 'king', 'element', 'mountain', 'opera', 'treaty', 'league',
+         'comet', 'sculptor', 'desert', 'dynasty', 'actor', 'medal']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Trivia API on synthetic question banks.')
+    parser.add_argument('database_url', nargs='?', default='sqlite://',
+                        help='scratch database (default: in-memory SQLite)')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='numbers of questions to seed, one run each')
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='requests per endpoint, size and transport')
+    parser.add_argument('--server', action='store_true',
+                        help='also drive a real WSGI server over HTTP')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare',
+                        help='JSON results of a previous run to compare with')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def app_config(database_url):
+    if database_url.startswith('sqlite'):
+        # Share one connection between the seeding code and the server
+        # thread, so both see the same in-memory database.
+        engine_options = {'poolclass': StaticPool,
+                          'connect_args': {'check_same_thread': False}}
+    else:
+        engine_options = {}
+    return {'SQLALCHEMY_DATABASE_URI': database_url,
+            'SQLALCHEMY_ENGINE_OPTIONS': engine_options}
+
+
+def chunked(rows, size=5000):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def seed(size, rnd):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(Category.__table__.insert(), [
+        {'id': id, 'type': type} for id, type in enumerate(CATEGORIES, 1)])
+    questions = [{
+        'id': id,
+        'question': 'Which {} is known for its {} and {}?'.format(
+            *rnd.sample(WORDS, 3)),
+        'answer': ' '.join(rnd.sample(WORDS, 2)),
+        'category': rnd.randint(1, len(CATEGORIES)),
+        'difficulty': rnd.randint(1, 5),
+    } for id in range(1, size + 1)]
+    for chunk in chunked(questions):
+        db.session.execute(Question.__table__.insert(), chunk)
+    db.session.commit()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(
+            "SELECT setval(pg_get_serial_sequence('questions', 'id'), "
+            "(SELECT max(id) FROM questions))")
+        db.session.execute('ANALYZE')
+        db.session.commit()
+
+
+def requests_for(size, rnd):
+    '''
+    Returns {endpoint: function returning (method, url, json body)}.
+    '''
+    pages = max(1, size // 10)
+    return {
+        'get_questions': lambda: (
+            'GET', '/questions?page={}'.format(rnd.randint(1, pages)), None),
+        'search_question': lambda: (
+            'POST', '/questions_search',
+            {'searchTerm': ' '.join(rnd.sample(WORDS, rnd.randint(1, 2)))}),
+        'get_questions_per_category': lambda: (
+            'GET', '/categories/{}/questions'.format(
+                rnd.randint(1, len(CATEGORIES))), None),
+        'play_quiz': lambda: (
+            'POST', '/quizzes',
+            {'previous_questions': [],
+             'quiz_category': {'id': rnd.randint(0, len(CATEGORIES)),
+                               'type': 'click'}}),
+        'play_quiz_session': QuizSessionRequests(rnd),
+    }
+
+
+class QuizSessionRequests(object):
+    '''
+    Plays quizzes the way a client holding a session does: the first request
+    starts a session, later ones send its token back until the quiz runs out.
+    '''
+
+    def __init__(self, rnd):
+        self.rnd = rnd
+        self.token = None
+        self.category = None
+
+    def __call__(self):
+        if self.token is None:
+            self.category = {'id': self.rnd.randint(0, len(CATEGORIES)),
+                             'type': 'click'}
+        return ('POST', '/quizzes',
+                {'previous_questions': [], 'quiz_category': self.category,
+                 'quiz_session': self.token or True})
+
+    def record(self, data):
+        self.token = data['quiz_session'] if data['question'] else None
+
+
+class TestClientTransport(object):
+    name = 'test_client'
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, url, body):
+        response = self.client.open(url, method=method, json=body)
+        assert response.status_code == 200, (url, response.status_code)
+        return response.get_json()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class ServerTransport(object):
+    '''
+    Serves the app from a background thread and sends real HTTP requests.
+    '''
+    name = 'wsgi_server'
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app,
+                                  request_handler=QuietRequestHandler)
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    def send(self, method, url, body):
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        request = urllib.request.Request(
+            self.base_url + url, data=data, method=method,
+            headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def record(make_request, data):
+    # Stateful clients, such as quiz sessions, build their next request
+    # from the last response.
+    if hasattr(make_request, 'record'):
+        make_request.record(data)
+
+
+def measure(transport, make_request, repeat, queries):
+    # A few requests first, so one-off loads (category map, quiz and
+    # search indexes) do not count against the endpoint.
+    for _ in range(3):
+        record(make_request, transport.send(*make_request()))
+
+    samples = []
+    queries_before = queries[0]
+    for _ in range(repeat):
+        method, url, body = make_request()
+        start = time.perf_counter()
+        data = transport.send(method, url, body)
+        samples.append((time.perf_counter() - start) * 1000)
+        record(make_request, data)
+    query_count = queries[0] - queries_before
+
+    # Traced separately: tracemalloc slows down the requests it watches.
+    tracemalloc.start()
+    record(make_request, transport.send(*make_request()))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(samples, 0.5), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'queries_per_request': round(query_count / repeat, 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_size(args, size):
+    rnd = random.Random(args.seed)
+    app = create_app(app_config(args.database_url))
+    results = []
+    with app.app_context():
+        started = time.perf_counter()
+        seed(size, rnd)
+        print('seeded {} questions in {:.1f}s'.format(
+            size, time.perf_counter() - started))
+
+        queries = [0]
+
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            queries[0] += 1
+
+        event.listen(db.engine, 'after_cursor_execute', count_query)
+        transports = [TestClientTransport(app)]
+        if args.server:
+            transports.append(ServerTransport(app))
+        try:
+            for transport in transports:
+                for endpoint, make_request in requests_for(size, rnd).items():
+                    result = measure(transport, make_request, args.repeat,
+                                     queries)
+                    result.update(size=size, endpoint=endpoint,
+                                  transport=transport.name)
+                    results.append(result)
+                    print_result(result)
+        finally:
+            event.remove(db.engine, 'after_cursor_execute', count_query)
+            for transport in transports:
+                if hasattr(transport, 'close'):
+                    transport.close()
+            db.session.remove()
+            db.drop_all()
+    return results
+
+
+def print_result(result, previous=None):
+    line = ('{size:>8} {endpoint:<28} {transport:<12} p50 {p50_ms:8.2f} ms  '
+            'p95 {p95_ms:8.2f} ms  p99 {p99_ms:8.2f} ms  '
+            '{queries_per_request:5.1f} q/req  {peak_kib:9.1f} KiB').format(
+                **result)
+    if previous is not None:
+        line += '  (p95 {:+.1f}%)'.format(
+            (result['p95_ms'] / previous['p95_ms'] - 1) * 100
+            if previous['p95_ms'] else 0)
+    print(line)
+
+
+def compare(results, path):
+    with open(path) as previous_file:
+        previous = {(result['size'], result['endpoint'], result['transport']):
+                    result for result in json.load(previous_file)['results']}
+    print('=' * 78)
+    print('compared with {}'.format(path))
+    print('=' * 78)
+    for result in results:
+        key = (result['size'], result['endpoint'], result['transport'])
+        if key in previous:
+            print_result(result, previous[key])
+
+
+def main():
+    args = parse_args()
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(args, size))
+
+    report = {
+        'started_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': args.database_url.split(':', 1)[0],
+        'repeat': args.repeat,
+        # ru_maxrss is in KiB on Linux.
+        'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
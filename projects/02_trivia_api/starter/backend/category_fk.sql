@@ -0,0 +1,41 @@
+--
+-- Turns questions.category into an indexed integer foreign key to categories.
+--
+-- Safe to run more than once, on databases restored from trivia.psql (where
+-- the column is already an integer) as well as on databases created by
+-- db.create_all() with the former String column:
+--
+--   psql trivia < category_fk.sql
+--
+
+BEGIN;
+
+-- Category ids stored as text become integers; empty or non-numeric values
+-- become NULL.
+ALTER TABLE public.questions
+    ALTER COLUMN category TYPE integer
+    USING CASE WHEN category::text ~ '^\s*\d+\s*$' THEN trim(category::text)::integer END;
+
+-- Questions pointing at categories that do not exist lose their category,
+-- as they would through ON DELETE SET NULL.
+UPDATE public.questions
+    SET category = NULL
+    WHERE category IS NOT NULL
+      AND category NOT IN (SELECT id FROM public.categories);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_catalog.pg_constraint
+        WHERE conrelid = 'public.questions'::regclass AND contype = 'f'
+    ) THEN
+        ALTER TABLE public.questions
+            ADD CONSTRAINT category FOREIGN KEY (category)
+            REFERENCES public.categories(id) ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS ix_questions_category ON public.questions USING btree (category);
+
+COMMIT;
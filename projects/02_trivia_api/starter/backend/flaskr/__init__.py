@@ -1,31 +1,107 @@
+import codecs
 import os
+import time
+import click
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
+from sqlalchemy import func
 
-from models import setup_db, Question, Category
+from models import setup_db, db, database_path, Question
+from .quiz import QuestionPicker, QuizSessions
+from .categories import CategoryRegistry
+from .search import QuestionSearch
+from .bulk import BATCH_SIZE, FORMATS, delete_questions, import_questions, read_questions
 
 QUESTIONS_PER_PAGE = 10
+CATEGORIES_TTL = 300
+MAX_SEARCH_RESULTS_PER_PAGE = 50
+
+
+def paginate_query(request, query, key=Question.id):
+    '''
+    Pages through query in SQL and formats only the rows returned.
+    ?page= selects a page by offset; ?cursor=<last id seen> continues after
+    that id instead, which stays cheap however deep the page is.
+    Returns the formatted questions and the cursor of the next page.
+    '''
+    cursor = request.args.get('cursor', None, type=int)
+    query = query.order_by(key)
+    if cursor is not None:
+        query = query.filter(key > cursor)
+    else:
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(404)
+        query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
+
+    questions = query.limit(QUESTIONS_PER_PAGE).all()
+    next_cursor = questions[-1].id if len(
+        questions) == QUESTIONS_PER_PAGE else None
+    return [question.format() for question in questions], next_cursor
+
+
+def count_rows(key):
+    return db.session.query(func.count(key)).scalar()
+
+
+class RowCounter(object):
+    '''
+    COUNT(key) kept in memory: adjusted by this process's inserts and
+    deletes and recounted every ttl seconds to include other processes.
+    '''
 
+    def __init__(self, key, ttl=60):
+        self.key = key
+        self.ttl = ttl
+        self.value = None
+        self.counted_at = None
 
-def paginate_questions(request, selection):
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
+    def get(self):
+        if self.counted_at is None or time.monotonic() - self.counted_at > self.ttl:
+            self.value = count_rows(self.key)
+            self.counted_at = time.monotonic()
+        return self.value
 
-    formatted_questions = [question.format() for question in selection]
-    current_questions = formatted_questions[start:end]
+    def add(self, delta):
+        if self.value is not None:
+            self.value += delta
 
-    return current_questions
+    def invalidate(self):
+        self.counted_at = None
+
+
+def wants_minimal_response(request):
+    return request.args.get('minimal', 'false').lower() in ('1', 'true', 'yes')
 
 # create and configure the app
 
 
 def create_app(test_config=None):
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
     CORS(app, resources={r"*": {"origins": "*"}})
+    question_picker = QuestionPicker()
+    quiz_sessions = QuizSessions(question_picker)
+    category_registry = CategoryRegistry(ttl=CATEGORIES_TTL)
+    question_search = QuestionSearch()
+    question_count = RowCounter(Question.id)
+
+    def questions_changed():
+        # Bulk writes bypass the per-question bookkeeping; reload lazily.
+        question_count.invalidate()
+        question_picker.invalidate()
+        question_search.invalidate()
+
+    def reset_caches():
+        # Drop everything held in memory; it is reloaded on next use.
+        questions_changed()
+        category_registry.invalidate()
+        quiz_sessions.clear()
+
+    app.reset_caches = reset_caches
 
     @app.after_request
     def after_request(response):
@@ -38,28 +114,28 @@ def create_app(test_config=None):
     # endpoint to handle GET requests for all available categories
     @app.route('/categories', methods=['GET'])
     def get_categories():
-        categories = {}
-        for category in Category.query.order_by(Category.id).all():
-            categories[category.id] = category.type
+        categories = category_registry.get()
 
         if (len(categories) == 0):
             abort(404)
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'categories': categories,
             'total_categories': len(categories),
         })
+        response.set_etag(category_registry.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = CATEGORIES_TTL
+        return response.make_conditional(request)
 
     # endpoint to handle GET requests for questions, including pagination (every 10 questions).
     @app.route('/questions', methods=['GET'])
     def get_questions():
-        selection = Question.query.order_by(Question.id).all()
-        categories = Category.query.all()
-        current_questions = paginate_questions(request, selection)
-        formatted_categories = {category.id: category.type
-                                for category in categories}
-        total_questions = len(selection)
+        current_questions, next_cursor = paginate_query(
+            request, Question.query)
+        formatted_categories = category_registry.get()
+        total_questions = question_count.get()
 
         if (len(current_questions) == 0):
             abort(404)
@@ -70,6 +146,7 @@ def create_app(test_config=None):
                 'total_questions': total_questions,
                 'categories': formatted_categories,
                 'current_category': None,
+                'next_cursor': next_cursor,
             }
 
         return jsonify(result)
@@ -85,14 +162,20 @@ def create_app(test_config=None):
                 abort(404)
 
             question.delete()
-            selection = Question.query.order_by(Question.id).all()
-            current_questions = paginate_questions(request, selection)
+            question_count.add(-1)
+            question_picker.remove(question_id)
+            question_search.remove(question_id)
+
+            if wants_minimal_response(request):
+                return jsonify({'success': True, 'delete': question_id})
+
+            current_questions, _ = paginate_query(request, Question.query)
 
             result = {
                 'success': True,
                 'delete': question_id,
                 'questions': current_questions,
-                'total_questions': len(Question.query.all())
+                'total_questions': question_count.get()
             }
 
             return jsonify(result)
@@ -114,15 +197,20 @@ def create_app(test_config=None):
             question = Question(question=new_question, category=new_category,
                                 difficulty=new_difficulty, answer=new_answer)
             question.insert()
+            question_count.add(1)
+            question_picker.add(question.id, question.category)
+            question_search.add(question)
+
+            if wants_minimal_response(request):
+                return jsonify({'success': True, 'created': question.id})
 
-            selection = Question.query.order_by(Question.id).all()
-            current_questions = paginate_questions(request, selection)
+            current_questions, _ = paginate_query(request, Question.query)
 
             result = {
                 'success': True,
                 'created': question.id,
                 'questions': current_questions,
-                'total_questions': len(Question.query.all())
+                'total_questions': question_count.get()
             }
 
             return jsonify(result)
@@ -130,16 +218,90 @@ def create_app(test_config=None):
         except:
             abort(422)
 
+    # bulk import questions from JSON Lines or CSV
+    @app.route('/questions/bulk', methods=['POST'])
+    def bulk_create_questions():
+        format = request.args.get('format') or (
+            'csv' if request.mimetype == 'text/csv' else 'jsonl')
+        batch_size = request.args.get('batch_size', BATCH_SIZE, type=int)
+        if format not in FORMATS or batch_size < 1:
+            abort(400)
+
+        lines = codecs.iterdecode(request.stream, 'utf-8')
+        summary = import_questions(read_questions(lines, format),
+                                   category_registry.get(), batch_size)
+        questions_changed()
+
+        return jsonify(dict(success=True, **summary))
+
+    # delete questions by id list and/or category
+    @app.route('/questions', methods=['DELETE'])
+    def batch_delete_questions():
+        body = request.get_json(silent=True) or {}
+        ids = body.get('ids', None)
+        category = body.get('category', None)
+        try:
+            if ids is not None:
+                ids = [int(id) for id in ids]
+            if category is not None:
+                category = int(category)
+        except (TypeError, ValueError):
+            abort(400)
+        if ids is None and category is None:
+            abort(400)
+
+        try:
+            summary = delete_questions(ids, category)
+        except Exception:
+            abort(422)
+        questions_changed()
+
+        return jsonify(dict(success=True, **summary))
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'format', type=click.Choice(FORMATS),
+                  help='Defaults to csv for .csv files, jsonl otherwise.')
+    @click.option('--batch-size', default=BATCH_SIZE)
+    def import_questions_command(path, format, batch_size):
+        """Bulk import questions from a JSON Lines or CSV file."""
+        format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+        with open(path, newline='', encoding='utf-8') as lines:
+            summary = import_questions(read_questions(lines, format),
+                                       category_registry.get(), batch_size)
+        for error in summary['errors']:
+            click.echo('line {line}: {error}'.format(**error), err=True)
+        click.echo('{inserted} inserted, {failed} failed in {elapsed_ms} ms'.format(
+            **summary))
+
+    @app.cli.command('delete-questions')
+    @click.option('--id', 'ids', type=int, multiple=True)
+    @click.option('--category', type=int)
+    def delete_questions_command(ids, category):
+        """Delete questions by id (repeatable) and/or category."""
+        if not ids and category is None:
+            raise click.UsageError('Give at least one --id or a --category.')
+        summary = delete_questions(list(ids) or None, category)
+        click.echo('{deleted} deleted in {elapsed_ms} ms'.format(**summary))
+
     # search for questions
     @app.route('/questions_search', methods=['POST'])
     def search_question():
+        body = request.get_json(silent=True) or {}
+        # Bad paging is a client error, not a missing result.
         try:
-            body = request.get_json()
-            search_term = body.get('searchTerm', '')
+            page = int(body.get('page', request.args.get('page', 1)))
+            limit = min(int(body.get('limit', QUESTIONS_PER_PAGE)),
+                        MAX_SEARCH_RESULTS_PER_PAGE)
+        except (TypeError, ValueError):
+            abort(400)
+        if page < 1 or limit < 1:
+            abort(400)
 
-            selection = Question.query.filter(
-                Question.question.ilike('%{}%'.format(search_term))).all()
-            current_questions = paginate_questions(request, selection)
+        try:
+            search_term = body.get('searchTerm', '')
+            total_questions, selection = question_search.search(
+                search_term, (page - 1) * limit, limit)
             formatted_questions = [question.format()
                                    for question in selection]
 
@@ -149,7 +311,7 @@ def create_app(test_config=None):
             result = {
                 'success': True,
                 'questions': formatted_questions,
-                'total_questions': len(formatted_questions),
+                'total_questions': total_questions,
                 'current_category': None
             }
 
@@ -162,16 +324,17 @@ def create_app(test_config=None):
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
     def get_questions_per_category(category_id):
         try:
-            category_id = str(category_id)
             selection = Question.query.filter(
-                Question.category == category_id).all()
-            current_questions = paginate_questions(request, selection)
+                Question.category == category_id)
+            current_questions, next_cursor = paginate_query(
+                request, selection)
 
             result = {
                 'success': True,
                 'questions': current_questions,
-                'total_questions': len(selection),
-                'current_category': category_id
+                'total_questions': selection.count(),
+                'next_cursor': next_cursor,
+                'current_category': str(category_id)
             }
 
             return jsonify(result)
@@ -185,30 +348,31 @@ def create_app(test_config=None):
         try:
             body = request.get_json()
             quiz_category = body.get('quiz_category', None).get('id')
-            previous_questions = body.get('previous_questions', None)
-
-            if (quiz_category == 0):
-                if previous_questions is not None:
-                    questions = Question.query.filter(
-                        Question.id.notin_(previous_questions)).all()
-                else:
-                    questions = Question.query.all()
+            previous_questions = body.get('previous_questions', None) or []
+            quiz_session = body.get('quiz_session', None)
+            if quiz_session:
+                # A token continues a server-side session, true starts one;
+                # clients echoing the token may omit previous_questions.
+                token, question = quiz_sessions.next_question(
+                    quiz_session if isinstance(quiz_session, str) else None,
+                    quiz_category, previous_questions)
             else:
-                questions = Question.query.filter(Question.category == quiz_category).filter(
-                    Question.id.notin_(previous_questions)).all()
-
-            if (len(questions) > 0):
-                question = random.choice(questions).format()
+                token = None
+                question = question_picker.pick(
+                    quiz_category, previous_questions)
 
+            if question is not None:
                 result = {
                     'success': True,
-                    'question': question
+                    'question': question.format(),
+                    'quiz_session': token
                 }
 
             else:
                 result = {
                     'succes': True,
-                    'question': None
+                    'question': None,
+                    'quiz_session': token
                 }
 
             return jsonify(result)
@@ -0,0 +1,120 @@
+import csv
+import json
+import time
+
+from models import db, Question
+
+FORMATS = ('jsonl', 'csv')
+BATCH_SIZE = 1000
+DIFFICULTIES = range(1, 6)
+
+
+def read_questions(lines, format):
+    '''
+    Yields one dict per question from an iterable of text lines,
+    JSON Lines or CSV with a header row.
+    '''
+    if format == 'csv':
+        yield from csv.DictReader(lines)
+    elif format == 'jsonl':
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Reported for its line by validate_question.
+                    yield line
+    else:
+        raise ValueError('Unsupported format: {}'.format(format))
+
+
+def validate_question(row, categories):
+    '''
+    Returns (record, None) for a valid row, (None, error message) otherwise.
+    '''
+    if not isinstance(row, dict):
+        return None, 'expected a JSON object'
+    question = row.get('question')
+    answer = row.get('answer')
+    if not question or not answer:
+        return None, 'question and answer are required'
+    try:
+        category = int(row.get('category'))
+        difficulty = int(row.get('difficulty'))
+    except (TypeError, ValueError):
+        return None, 'category and difficulty must be integers'
+    if category not in categories:
+        return None, 'unknown category {}'.format(category)
+    if difficulty not in DIFFICULTIES:
+        return None, 'difficulty must be between 1 and 5'
+    return {
+        'question': question,
+        'answer': answer,
+        'category': category,
+        'difficulty': difficulty,
+    }, None
+
+
+def import_questions(rows, categories, batch_size=BATCH_SIZE):
+    '''
+    Validates rows and inserts the valid ones, one transaction and one
+    executemany per batch. A batch failing in the database is rolled back
+    and reported against each of its lines.
+    '''
+    started = time.perf_counter()
+    inserted = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        try:
+            db.session.execute(Question.__table__.insert(),
+                               [record for _, record in batch])
+            db.session.commit()
+            inserted += len(batch)
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({'line': line, 'error': str(e)} for line, _ in batch)
+        batch.clear()
+
+    for line, row in enumerate(rows, start=1):
+        record, error = validate_question(row, categories)
+        if error:
+            errors.append({'line': line, 'error': error})
+            continue
+        batch.append((line, record))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    return {
+        'inserted': inserted,
+        'failed': len(errors),
+        'errors': errors,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def delete_questions(ids=None, category=None):
+    '''
+    Deletes the questions with the given ids and/or category in one
+    statement and one transaction.
+    '''
+    started = time.perf_counter()
+    query = Question.query
+    if ids is not None:
+        query = query.filter(Question.id.in_(ids))
+    if category is not None:
+        query = query.filter(Question.category == category)
+    try:
+        deleted = query.delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {
+        'deleted': deleted,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import time
+
+from sqlalchemy import event
+
+from models import Category
+
+# Bumped on every write to the categories table, from any session.
+_generation = 0
+
+
+def _category_written(mapper, connection, target):
+    global _generation
+    _generation += 1
+
+
+for _name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Category, _name, _category_written)
+
+
+class CategoryRegistry(object):
+    '''
+    The {id: type} category map shared by the endpoints, loaded once and
+    reloaded after a write to Category or once ttl seconds have passed.
+    etag identifies the current map for conditional GET requests.
+    '''
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.loaded_at = None
+        self.generation = None
+        self.categories = {}
+        self.etag = None
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def is_stale(self):
+        return (self.loaded_at is None
+                or self.generation != _generation
+                or time.monotonic() - self.loaded_at > self.ttl)
+
+    def load(self):
+        generation = _generation
+        categories = {category.id: category.type
+                      for category in Category.query.order_by(Category.id)}
+        self.categories = categories
+        self.etag = hashlib.sha1(json.dumps(
+            sorted(categories.items())).encode('utf-8')).hexdigest()
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+
+    def get(self):
+        if self.is_stale():
+            self.load()
+        return self.categories
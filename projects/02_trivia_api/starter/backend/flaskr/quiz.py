@@ -0,0 +1,215 @@
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from models import db, Question
+
+# Random draws tried before falling back to scanning the remaining ids.
+MAX_DRAWS = 8
+
+
+class IdSet(object):
+    '''
+    Set of ids supporting O(1) add, remove and uniform random choice.
+    '''
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, id):
+        return id in self.positions
+
+    def add(self, id):
+        if id not in self.positions:
+            self.positions[id] = len(self.ids)
+            self.ids.append(id)
+
+    def remove(self, id):
+        position = self.positions.pop(id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if last != id:
+            self.ids[position] = last
+            self.positions[last] = position
+
+    def choice(self):
+        return random.choice(self.ids)
+
+
+class QuestionPicker(object):
+    '''
+    In-memory index of question ids per category used to draw quiz questions
+    without loading the candidate questions from the database.
+    The index is reloaded every ttl seconds to pick up changes made by other
+    processes; add()/remove() keep it current for writes made by this one.
+    '''
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.loaded_at = None
+        self.all = IdSet()
+        self.categories = {}
+        self.category_of = {}
+
+    def load(self):
+        self.all = IdSet()
+        self.categories = {}
+        self.category_of = {}
+        for id, category in db.session.query(Question.id, Question.category):
+            self.add(id, category)
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def ensure_loaded(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl:
+            self.load()
+
+    def add(self, id, category):
+        category = str(category)
+        self.all.add(id)
+        self.categories.setdefault(category, IdSet()).add(id)
+        self.category_of[id] = category
+
+    def remove(self, id):
+        self.all.remove(id)
+        category = self.category_of.pop(id, None)
+        if category is not None:
+            self.categories[category].remove(id)
+
+    def candidates(self, category):
+        if not category:
+            return self.all
+        return self.categories.get(str(category), IdSet())
+
+    def pick_id(self, category, excluded):
+        '''
+        Returns a random id of the category (any category if falsy) that is
+        not in excluded, or None when every question has been excluded.
+        '''
+        self.ensure_loaded()
+        ids = self.candidates(category)
+        if len(ids) == 0:
+            return None
+        for _ in range(MAX_DRAWS):
+            id = ids.choice()
+            if id not in excluded:
+                return id
+        remaining = [id for id in ids if id not in excluded]
+        if not remaining:
+            return None
+        return random.choice(remaining)
+
+    def pick(self, category, excluded):
+        '''
+        Returns a random eligible Question, fetched by primary key.
+        '''
+        excluded = set(excluded)
+        while True:
+            id = self.pick_id(category, excluded)
+            if id is None:
+                return None
+            question = Question.query.get(id)
+            if question is not None:
+                return question
+            # Deleted by another process since the index was loaded.
+            self.remove(id)
+
+
+class QuizSession(object):
+    '''
+    One quiz in progress: its category and the ids already served (or
+    skipped), so its memory grows with the length of the quiz rather than
+    with the number of questions. Draws go through the shared QuestionPicker.
+    '''
+
+    def __init__(self, category, served, expires):
+        self.category = category
+        self.served = set(served)
+        self.expires = expires
+        # Serializes draws for one token, so concurrent requests never
+        # serve the same question twice.
+        self.lock = threading.Lock()
+
+    def draw(self, picker):
+        with self.lock:
+            id = picker.pick_id(self.category, self.served)
+            if id is not None:
+                self.served.add(id)
+            return id
+
+
+class QuizSessions(object):
+    '''
+    Server-side quiz sessions keyed by an opaque token, so that clients do not
+    have to send back every question they have seen. Sessions expire ttl
+    seconds after their last use; at most max_sessions are kept, evicting the
+    least recently used first.
+    '''
+
+    def __init__(self, picker, ttl=1800, max_sessions=10000):
+        self.picker = picker
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def evict(self, now):
+        while self.sessions:
+            token, session = next(iter(self.sessions.items()))
+            if session.expires > now and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[token]
+
+    def clear(self):
+        with self.lock:
+            self.sessions.clear()
+
+    def get(self, token, category):
+        now = time.monotonic()
+        with self.lock:
+            self.evict(now)
+            session = self.sessions.get(token) if token else None
+            if session is None or session.category != category:
+                return None
+            session.expires = now + self.ttl
+            self.sessions.move_to_end(token)
+            return session
+
+    def start(self, category, excluded):
+        token = secrets.token_urlsafe(16)
+        now = time.monotonic()
+        session = QuizSession(category, excluded, now + self.ttl)
+        with self.lock:
+            self.evict(now)
+            self.sessions[token] = session
+        return token, session
+
+    def next_question(self, token, category, previous_questions=()):
+        '''
+        Returns (token, Question or None). An unknown or expired token starts a
+        new session that skips previous_questions.
+        '''
+        session = self.get(token, category)
+        if session is None:
+            token, session = self.start(category, previous_questions)
+        while True:
+            id = session.draw(self.picker)
+            if id is None:
+                return token, None
+            question = Question.query.get(id)
+            if question is not None:
+                return token, question
+            # Deleted by another process since the index was loaded.
+            self.picker.remove(id)
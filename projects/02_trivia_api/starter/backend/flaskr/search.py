@@ -0,0 +1,122 @@
+import math
+import re
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import func, literal_column
+
+from models import db, Question, SEARCH_DOCUMENT
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN.findall((text or '').lower())
+
+
+class InvertedIndex(object):
+    '''
+    Pure-Python full-text index over question and answer text, used when the
+    database is not Postgres (e.g. SQLite in tests). Like plainto_tsquery,
+    a document matches when it contains every word of the search term;
+    matches are ranked by tf-idf.
+    '''
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+
+    def add(self, id, *texts):
+        self.remove(id)
+        counts = Counter(token for text in texts for token in tokenize(text))
+        self.documents[id] = counts
+        for token, count in counts.items():
+            self.postings[token][id] = count
+
+    def remove(self, id):
+        counts = self.documents.pop(id, None)
+        if counts is None:
+            return
+        for token in counts:
+            postings = self.postings[token]
+            postings.pop(id, None)
+            if not postings:
+                del self.postings[token]
+
+    def search(self, term):
+        tokens = set(tokenize(term))
+        if not tokens:
+            return []
+        postings = sorted((self.postings.get(token, {}) for token in tokens),
+                          key=len)
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+        total = len(self.documents)
+        scores = {}
+        for id in matches:
+            scores[id] = sum(
+                posting[id] * math.log(1 + total / len(posting))
+                for posting in postings)
+        return sorted(matches, key=lambda id: (-scores[id], id))
+
+
+class QuestionSearch(object):
+    '''
+    Ranked full-text search over questions: tsvector/GIN on Postgres,
+    an InvertedIndex elsewhere. The fallback index is built on first use,
+    reloaded every ttl seconds and kept current by add()/remove().
+    '''
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.index = None
+        self.loaded_at = None
+
+    def uses_postgres(self):
+        return db.engine.dialect.name == 'postgresql'
+
+    def invalidate(self):
+        self.index = None
+
+    def add(self, question):
+        if self.index is not None:
+            self.index.add(question.id, question.question, question.answer)
+
+    def remove(self, id):
+        if self.index is not None:
+            self.index.remove(id)
+
+    def fallback_index(self):
+        if self.index is None or time.monotonic() - self.loaded_at > self.ttl:
+            index = InvertedIndex()
+            rows = db.session.query(
+                Question.id, Question.question, Question.answer)
+            for id, question, answer in rows:
+                index.add(id, question, answer)
+            self.index = index
+            self.loaded_at = time.monotonic()
+        return self.index
+
+    def search(self, term, offset, limit):
+        '''
+        Returns (total matches, questions of the requested page), best
+        matches first.
+        '''
+        if self.uses_postgres():
+            document = literal_column(SEARCH_DOCUMENT)
+            query = func.plainto_tsquery('english', term)
+            matches = Question.query.filter(document.op('@@')(query))
+            total = matches.count()
+            questions = matches.order_by(
+                func.ts_rank(document, query).desc(), Question.id
+            ).offset(offset).limit(limit).all()
+            return total, questions
+
+        ids = self.fallback_index().search(term)
+        page = ids[offset:offset + limit]
+        if not page:
+            return len(ids), []
+        by_id = {question.id: question for question in
+                 Question.query.filter(Question.id.in_(page))}
+        return len(ids), [by_id[id] for id in page if id in by_id]
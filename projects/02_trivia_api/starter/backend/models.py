@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, ForeignKey, create_engine, event, DDL
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -34,7 +35,8 @@ class Question(db.Model):
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE',
+                                          ondelete='SET NULL'), index=True)
     difficulty = Column(Integer)
 
     def __init__(self, question, answer, category, difficulty):
@@ -43,6 +45,13 @@ class Question(db.Model):
         self.category = category
         self.difficulty = difficulty
 
+    @validates('category')
+    def validate_category(self, key, category):
+        # Clients send category ids as strings ("5"); store them as integers.
+        if category is None or category == '':
+            return None
+        return int(category)
+
     def insert(self):
         db.session.add(self)
         db.session.commit()
@@ -65,6 +74,20 @@ class Question(db.Model):
         }
 
 
+'''
+Full-text search document of a question, matched by the GIN index below.
+Queries must use this exact expression for Postgres to pick the index.
+'''
+SEARCH_DOCUMENT = "to_tsvector('english', coalesce(question, '') || ' ' || coalesce(answer, ''))"
+
+event.listen(
+    Question.__table__,
+    'after_create',
+    DDL('CREATE INDEX IF NOT EXISTS ix_questions_search ON questions '
+        'USING gin (' + SEARCH_DOCUMENT + ')').execute_if(dialect='postgresql')
+)
+
+
 '''
 Category
 
@@ -1,10 +1,149 @@
 import os
+import re
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import db, Question
+
+# In-memory SQLite by default; point this at a Postgres database, e.g.
+# postgresql://localhost:5432/trivia_test, to run against Postgres.
+DATABASE_URL = os.environ.get('TRIVIA_TEST_DATABASE_URL', 'sqlite://')
+# Set by pytest-xdist; each parallel worker gets its own Postgres schema.
+WORKER = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'trivia.psql')
+
+COPY = re.compile(r'^COPY (?:\w+\.)?(\w+) \((.*)\) FROM stdin;$')
+
+
+def app_config():
+    if DATABASE_URL.startswith('sqlite'):
+        # One shared connection, so every test sees the same in-memory
+        # database.
+        engine_options = {'poolclass': StaticPool,
+                          'connect_args': {'check_same_thread': False}}
+    else:
+        engine_options = {'connect_args': {
+            'options': '-csearch_path=trivia_test_{}'.format(WORKER)}}
+    return {
+        'SQLALCHEMY_DATABASE_URI': DATABASE_URL,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options,
+        'TESTING': True,
+    }
+
+
+def read_seed_rows(path):
+    '''
+    Yields (table name, rows) for each COPY block of a pg_dump file.
+    '''
+    with open(path, encoding='utf-8') as dump:
+        lines = iter(dump)
+        for line in lines:
+            match = COPY.match(line.rstrip('\n'))
+            if not match:
+                continue
+            columns = [column.strip() for column in match.group(2).split(',')]
+            rows = []
+            for line in lines:
+                line = line.rstrip('\n')
+                if line == '\\.':
+                    break
+                values = [None if value == '\\N' else value
+                          for value in line.split('\t')]
+                rows.append(dict(zip(columns, values)))
+            yield match.group(1), rows
+
+
+def seed(connection, path=SEED_FILE):
+    for name, rows in read_seed_rows(path):
+        table = db.metadata.tables[name]
+        types = {column.name: column.type.python_type for column in table.c}
+        connection.execute(table.insert(), [
+            {key: None if value is None else types[key](value)
+             for key, value in row.items()}
+            for row in rows])
+        if connection.dialect.name == 'postgresql':
+            # Rows were inserted with their ids; move the sequence past them.
+            connection.execute(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "(SELECT max(id) FROM {0}))".format(name))
+
+
+def enable_sqlite_savepoints(engine):
+    # pysqlite manages transactions itself and breaks SAVEPOINT; let
+    # SQLAlchemy emit BEGIN instead.
+    @event.listens_for(engine, 'connect')
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def do_begin(connection):
+        connection.execute('BEGIN')
+
+
+# The app, schema and seed data, shared by every test of a process.
+app = None
+connection = None
+
+
+def start_savepoint(session, transaction, connection):
+    # Each session the app opens works inside a savepoint of the test
+    # transaction, set before its first statement.
+    if transaction.parent is None:
+        session.begin_nested()
+        session.connection()
+
+
+def restart_savepoint(session, transaction):
+    # Commits and rollbacks by the app end the savepoint, not the test
+    # transaction; open a new one for the next unit of work.
+    if transaction.nested and not transaction.parent.nested:
+        session.expire_all()
+        session.begin_nested()
+
+
+def rollback_savepoint(exception=None):
+    # Closing a session leaves its savepoint open; roll it back, as closing
+    # the session would roll back its own transaction.
+    db.session.rollback()
+
+
+def setUpModule():
+    global app, connection
+    app = create_app(app_config())
+    engine = db.get_engine(app)
+    if engine.dialect.name == 'sqlite':
+        enable_sqlite_savepoints(engine)
+    connection = engine.connect()
+    if engine.dialect.name == 'postgresql':
+        connection.execute('DROP SCHEMA IF EXISTS trivia_test_{0} CASCADE; '
+                           'CREATE SCHEMA trivia_test_{0}'.format(WORKER))
+    with connection.begin():
+        db.metadata.create_all(connection)
+        seed(connection)
+
+    # Join the app's sessions to the test transaction ("Joining a Session
+    # into an External Transaction" in the SQLAlchemy docs).
+    db.session.remove()
+    db.session.configure(bind=connection, binds={})
+    event.listen(db.session, 'after_begin', start_savepoint)
+    event.listen(db.session, 'after_transaction_end', restart_savepoint)
+    # Runs before Flask-SQLAlchemy's own teardown, which closes the session.
+    app.teardown_appcontext(rollback_savepoint)
+
+
+def tearDownModule():
+    db.session.remove()
+    event.remove(db.session, 'after_begin', start_savepoint)
+    event.remove(db.session, 'after_transaction_end', restart_savepoint)
+    if connection.dialect.name == 'postgresql':
+        connection.execute(
+            'DROP SCHEMA IF EXISTS trivia_test_{} CASCADE'.format(WORKER))
+    connection.close()
+    db.get_engine(app).dispose()
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -12,23 +151,23 @@ class TriviaTestCase(unittest.TestCase):
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
+        # Everything a test writes, commits included, happens inside this
+        # transaction and is rolled back in tearDown.
+        self.transaction = connection.begin()
+        app.reset_caches()
+        self.app = app
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format(
-            'localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
-
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
+        self.new_question = {
+            'question': 'What is the capital of Portugal?',
+            'answer': 'Lisbon',
+            'category': '3',
+            'difficulty': 1}
 
     def tearDown(self):
         """Executed after reach test"""
-        pass
+        rollback_savepoint()
+        db.session.remove()
+        self.transaction.rollback()
 
     def get_categories(self):
         res = self.client().get('/categories')
@@ -39,6 +178,17 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_categories'])
         self.assertTrue(len(data['categories']))
 
+    def test_get_categories_not_modified(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+
+        res = self.client().get('/categories',
+                                headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['ETag'], etag)
+        self.assertIn('max-age', res.headers['Cache-Control'])
+
     def test_get_paginated_questions(self):
         res = self.client().get('/questions')
         data = json.loads(res.data)
@@ -48,6 +198,20 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_questions'])
         self.assertTrue(len(data['questions']))
 
+    def test_get_questions_after_cursor(self):
+        first_page = json.loads(self.client().get('/questions').data)
+        res = self.client().get(
+            '/questions?cursor={}'.format(first_page['next_cursor']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(len(data['questions']))
+        self.assertTrue(all(question['id'] > first_page['next_cursor']
+                            for question in data['questions']))
+        self.assertEqual(data['total_questions'],
+                         first_page['total_questions'])
+
     def test_error_beyond_valid_page(self):
         res = self.client().get('/questions?page=50')
         data = json.loads(res.data)
@@ -87,6 +251,44 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['created'])
         self.assertEqual(len(data['questions']))
 
+    def test_create_question_minimal_response(self):
+        res = self.client().post('/questions?minimal=true', json={
+            'question': 'What is the capital of Portugal?',
+            'answer': 'Lisbon',
+            'category': '3',
+            'difficulty': 1})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['created'])
+        self.assertNotIn('questions', data)
+
+    def test_bulk_import_and_delete_questions(self):
+        body = 'question,answer,category,difficulty\n' \
+            'Bulk question?,Bulk answer,3,2\n' \
+            'Bulk question?,Bulk answer,3,9\n'
+        res = self.client().post('/questions/bulk', data=body,
+                                 content_type='text/csv')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['failed'], 1)
+        self.assertEqual(data['errors'][0]['line'], 2)
+
+        id = Question.query.filter_by(question='Bulk question?').one().id
+        res = self.client().delete('/questions', json={'ids': [id]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], 1)
+
+    def test_batch_delete_without_selection(self):
+        res = self.client().delete('/questions', json={})
+
+        self.assertEqual(res.status_code, 400)
+
     def test_create_unallowed_new_question(self):
         res = self.client().post('/questions/150', json=self.new_question)
         data = json.loads(res.data)
@@ -100,11 +302,30 @@ class TriviaTestCase(unittest.TestCase):
                                  json={'searchTerm': 'Tom'})
         data = json.loads(res.data)
 
+        # Matches 'Tom Hanks' in a question and 'Tom Cruise' in an answer.
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data['success'], True)
-        self.assertEqual(data['total_questions'])
+        self.assertEqual(data['total_questions'], 2)
+        self.assertEqual(len(data['questions']), 2)
+
+    def test_search_question_paginated(self):
+        res = self.client().post('/questions_search',
+                                 json={'searchTerm': 'Tom', 'page': 2, 'limit': 1})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 2)
         self.assertEqual(len(data['questions']), 1)
 
+    def test_search_question_invalid_page(self):
+        for paging in ({'page': 0}, {'limit': 0}, {'page': 'two'}):
+            res = self.client().post('/questions_search',
+                                     json=dict(paging, searchTerm='Tom'))
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(data['success'], False)
+
     def test_unsuccessful_search_question(self):
         res = self.client().post('/questions_search',
                                  json={'searchTerm': 'Thisisnotasearchterm'})
@@ -142,6 +363,51 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertTrue(data['question'])
 
+    def test_quiz_skips_previous_questions(self):
+        category = json.loads(
+            self.client().get('/categories/5/questions').data)
+        previous_questions = [question['id']
+                              for question in category['questions']]
+        res = self.client().post('/quizzes', json={
+            'previous_questions': previous_questions[1:],
+            'quiz_category': {'type': 'Entertainment', 'id': 5}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], previous_questions[0])
+
+    def test_quiz_session_does_not_repeat_questions(self):
+        quiz_category = {'type': 'Entertainment', 'id': 5}
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [], 'quiz_category': quiz_category,
+            'quiz_session': True})
+        data = json.loads(res.data)
+        served = [data['question']['id']]
+
+        while data['question'] is not None:
+            res = self.client().post('/quizzes', json={
+                'quiz_session': data['quiz_session'],
+                'quiz_category': quiz_category})
+            data = json.loads(res.data)
+            if data['question'] is not None:
+                served.append(data['question']['id'])
+
+        category = json.loads(
+            self.client().get('/categories/5/questions').data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(served), len(set(served)))
+        self.assertEqual(len(served), category['total_questions'])
+
+    def test_quiz_without_session_keeps_no_state(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': {'type': 'Entertainment', 'id': 5}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['category'], 5)
+        self.assertIsNone(data['quiz_session'])
+
     def test_quizz_fails(self):
         res = self.client().post('/quizzes')
         data = json.loads(res.data)
@@ -57,7 +57,7 @@ def add_drinks(payload):
     new_recipe = body.get('recipe', None)
 
     try:
-        drink = Drink(title=new_title, recipe=json.dumps([new_recipe]))
+        drink = Drink(title=new_title, recipe=[new_recipe])
         drink.insert()
 
         # all_drinks = Drink.query.order_by(Drink.id).all()
@@ -1,120 +1,24 @@
-import json
-from flask import request, _request_ctx_stack, abort
-from functools import wraps
-from jose import jwt
-from urllib.request import urlopen
+from fsnd_auth import (AllOf, AnyOf, Auth, AuthError, authorization_stats,
+                       get_token_auth_header, keys_from_env)
 
 
 AUTH0_DOMAIN = 'dev-epds.eu.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'Drinks_API'
 
-# AuthError Exception
+# Set JWKS_URL (e.g. file:///path/to/jwks.json or a local server) or
+# AUTH_KEYS_FILE (a JWKS or PEM file) to verify tokens offline.
+auth = Auth(
+    keys_from_env(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'),
+    audience=API_AUDIENCE,
+    issuer='https://' + AUTH0_DOMAIN + '/',
+    algorithms=ALGORITHMS
+)
 
-
-class AuthError(Exception):
-    def __init__(self, error, status_code):
-        self.error = error
-        self.status_code = status_code
-
-
-# Auth Header
-
-
-def get_token_auth_header():
-    if 'Authorization' not in request.headers:
-        abort(401)
-
-    auth_header = request.headers['Authorization']
-    header_parts = auth_header.split(' ')
-
-    if len(header_parts) != 2:
-        abort(401)
-    elif header_parts[0].lower() != 'bearer':
-        abort(401)
-
-    return header_parts[1]
-
-
-def check_permissions(permission, payload):
-    if 'permissions' not in payload:
-        raise AuthError({
-            'success': False,
-            'code': 'invalid_claims',
-            'description': 'Permissions not included in JWT.'
-        }, 400)
-
-    if permission not in payload['permissions']:
-        raise AuthError({
-            'success': False,
-            'code': 'unauthorized',
-            'description': 'Permission not found.'
-        }, 401)
-    return True
-
-
-def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
-    if 'kid' not in unverified_header:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Authorization malformed.'
-        }, 401)
-
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
-    if rsa_key:
-        try:
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
-            )
-
-            return payload
-
-        except jwt.ExpiredSignatureError:
-            raise AuthError({
-                'code': 'token_expired',
-                'description': 'Token expired.'
-            }, 401)
-
-        except jwt.JWTClaimsError:
-            raise AuthError({
-                'code': 'invalid_claims',
-                'description': 'Incorrect claims. Please, check the audience and issuer.'
-            }, 401)
-        except Exception:
-            raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to parse authentication token.'
-            }, 400)
-    raise AuthError({
-        'code': 'invalid_header',
-                'description': 'Unable to find the appropriate key.'
-    }, 400)
+token_cache = auth.token_cache
+verify_decode_jwt = auth.verify_decode_jwt
+check_permissions = auth.check_permissions
 
 
 def requires_auth(permission=''):
-    def requires_auth_decorator(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
-            return f(payload, *args, **kwargs)
-
-        return wrapper
-    return requires_auth_decorator
+    return auth.requires_auth(permission)
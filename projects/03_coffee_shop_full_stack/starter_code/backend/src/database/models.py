@@ -1,5 +1,8 @@
 import os
+from functools import lru_cache
 from sqlalchemy import Column, String, Integer
+from sqlalchemy.orm import validates
+from sqlalchemy.types import TypeDecorator
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -29,6 +32,60 @@ def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
 
+'''
+Recipe
+    a drink's ingredients, decoded once and shared by every row storing
+    the same JSON, with the short form precomputed
+    !!NOTE instances are shared: treat ingredients and short as read-only
+'''
+class Recipe(object):
+    __slots__ = ('json', 'ingredients', 'short')
+
+    def __init__(self, recipe_json):
+        self.json = recipe_json
+        self.ingredients = json.loads(recipe_json)
+        self.short = [{'color': r['color'], 'parts': r['parts']} for r in self.ingredients]
+
+    def __eq__(self, other):
+        return isinstance(other, Recipe) and self.json == other.json
+
+    def __hash__(self):
+        return hash(self.json)
+
+
+@lru_cache(maxsize=1024)
+def load_recipe(recipe_json):
+    return Recipe(recipe_json)
+
+
+'''
+to_recipe(value)
+    a Recipe from a Recipe, its JSON string or its list of ingredients
+'''
+def to_recipe(value):
+    if isinstance(value, Recipe):
+        return value
+    if not isinstance(value, str):
+        value = json.dumps(value)
+    return load_recipe(value)
+
+
+'''
+RecipeType
+    stores a Recipe as its JSON string; rows load as cached Recipe objects,
+    so reading drinks does not parse their recipes again
+'''
+class RecipeType(TypeDecorator):
+    impl = String(180)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_recipe(value).json
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else load_recipe(value)
+
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -38,21 +95,24 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients, loaded as a Recipe; may be set to a Recipe, its list
+    # of ingredients or its JSON string
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    recipe =  Column(RecipeType, nullable=False)
+
+    @validates('recipe')
+    def validate_recipe(self, key, recipe):
+        return None if recipe is None else to_recipe(recipe)
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': self.recipe.short
         }
 
     '''
@@ -63,7 +123,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe.ingredients
         }
 
     '''